@@ -0,0 +1,122 @@
+import time
+from typing import List
+from bot.models import GradeSnapshot, ClassGrade
+from bot.history import GradeDiff
+
+# Telegram allows 4096 characters per message; leave room for HTML entities
+MAX_MESSAGE_LENGTH = 3000
+
+
+def format_score(score_text, percentage=None):
+    """Helper function to format score with emoji indicators"""
+    try:
+        if percentage is not None:
+            score = float(percentage)
+            if score >= 90:
+                return f'☘️ <b>{score_text}</b>'  # Green checkmark for good scores
+            elif score >= 80:
+                return f'⚠️ <b>{score_text}</b>'  # Warning symbol for scores between 80 and 89
+            else:
+                return f'‼️ <b>{score_text}</b>'  # Red cross for scores below 80
+    except (ValueError, TypeError):
+        pass
+    return score_text
+
+
+def render_class(class_grade: ClassGrade) -> str:
+    """Render one class and its assignments as a Telegram HTML block"""
+    class_message = f"📘 <b>{class_grade.course_name}</b>\n"
+    class_message += "------------------------------\n"
+    class_message += f"Grade: {format_score(class_grade.grade or 'No grade', class_grade.percentage)}\n"
+    class_message += f"Teacher: {class_grade.teacher}\n"
+
+    if class_grade.assignments:
+        # Sort assignments by date (most recent first)
+        sorted_assignments = sorted(
+            class_grade.assignments,
+            key=lambda a: a.due_date or 0,
+            reverse=True
+        )
+
+        class_message += "\nAssignments:\n"
+        for assignment in sorted_assignments:
+            date_str = ''
+            if assignment.due_date:
+                date_str = time.strftime('%Y-%m-%d', time.localtime(assignment.due_date/1000))
+
+            score = assignment.score if assignment.score is not None else "Not graded"
+
+            class_message += f"• <i>{assignment.name}</i>\n"
+            class_message += f"  📅 Due: {date_str}\n"
+            class_message += f"  📝 {assignment.category}: {format_score(score, assignment.score_percent)}\n"
+
+    return class_message + "\n"
+
+
+def render_grades_messages(snapshot: GradeSnapshot, title: str = "📚 Current Grades") -> List[str]:
+    """Turn a snapshot into one or more Telegram messages (no network access)"""
+    messages = []
+    current_message = title
+
+    if snapshot.student_name:
+        current_message += f" for {snapshot.student_name}"
+    current_message += ":\n\n"
+
+    graded_classes = snapshot.graded_classes
+    if not graded_classes:
+        return ["No grades or assignments found for the current term."]
+
+    summary_lines = []
+    for class_grade in graded_classes:
+        summary_lines.append(
+            f"📘 {class_grade.course_name}: {format_score(class_grade.grade or 'No grade', class_grade.percentage)}"
+        )
+
+        class_message = render_class(class_grade)
+
+        # If adding this class would make the message too long, start a new message
+        if len(current_message + class_message) > MAX_MESSAGE_LENGTH:
+            messages.append(current_message)
+            current_message = class_message
+        else:
+            current_message += class_message
+
+    # Add summary to the last message
+    summary_section = "\n📊 <b>Grade Summary:</b>\n" + "------------------------------\n" + "\n".join(summary_lines) + "\n"
+    if len(current_message + summary_section) > MAX_MESSAGE_LENGTH:
+        messages.append(current_message)
+        current_message = summary_section
+    else:
+        current_message += summary_section
+
+    messages.append(current_message)
+    return messages
+
+
+def render_changes_message(diff: GradeDiff, since: str) -> str:
+    """Summarise a GradeDiff as one Telegram message (`since` e.g. 'yesterday's update')"""
+    message = f"🔔 <b>What changed</b> since {since}:\n\n"
+
+    for changes in diff.changed:
+        message += f"📘 <b>{changes.course_name}</b>\n"
+        if changes.grade_changed:
+            old = format_score(changes.old_grade or 'No grade', changes.old_percentage)
+            new = format_score(changes.new_grade or 'No grade', changes.new_percentage)
+            message += f"Grade: {old} → {new}\n"
+        for assignment in changes.new_assignments:
+            score = assignment.score if assignment.score is not None else "Not graded"
+            message += f"• New: <i>{assignment.name}</i> – {format_score(score, assignment.score_percent)}\n"
+        for before, after in changes.rescored:
+            old = before.score if before.score is not None else "Not graded"
+            new = after.score if after.score is not None else "Not graded"
+            message += f"• <i>{after.name}</i>: {old} → {format_score(new, after.score_percent)}\n"
+        message += "\n"
+
+    for class_grade in diff.added_classes:
+        message += f"➕ New class: <b>{class_grade.course_name}</b>\n"
+    for class_grade in diff.removed_classes:
+        message += f"➖ No longer listed: <b>{class_grade.course_name}</b>\n"
+
+    if len(message) > MAX_MESSAGE_LENGTH:
+        message = message[:MAX_MESSAGE_LENGTH].rsplit("\n", 1)[0] + "\n…"
+    return message
@@ -0,0 +1,84 @@
+import time
+from typing import Optional
+from bot.cache import TTLCache
+from bot.history import load_latest
+from bot.models import ClassRoster, GradeSnapshot
+import config
+
+# Most recent GradeSnapshot per telegram_id, so repeated /grades calls (and a
+# daily job running right after a manual check) do not scrape Aspen again.
+grade_cache = TTLCache(maxsize=config.GRADE_CACHE_SIZE, ttl=config.GRADE_CACHE_TTL)
+
+# Snapshots scraped ahead of a user's notification time, consumed by the send job.
+# Entries older than PREFETCH_MAX_AGE are stale and trigger a live fetch instead.
+prefetch_cache = TTLCache(maxsize=config.GRADE_CACHE_SIZE, ttl=config.PREFETCH_MAX_AGE)
+
+# ClassRoster per telegram_id; the entry carries its term and is replaced when
+# a fetch returns a different set of classes (term rollover)
+roster_cache = TTLCache(maxsize=config.GRADE_CACHE_SIZE, ttl=config.ROSTER_CACHE_TTL)
+
+
+def get_cached_snapshot(telegram_id: int) -> Optional[GradeSnapshot]:
+    return grade_cache.get(telegram_id)
+
+
+def cache_snapshot(telegram_id: int, snapshot: GradeSnapshot):
+    grade_cache.set(telegram_id, snapshot, stored_at=snapshot.fetched_at)
+    update_roster(telegram_id, snapshot)
+
+
+def invalidate_snapshot(telegram_id: int):
+    grade_cache.pop(telegram_id)
+
+
+def invalidate_user_grades(telegram_id: int):
+    """Drop every cached snapshot and the roster for a user (credentials changed or account deleted)"""
+    grade_cache.pop(telegram_id)
+    prefetch_cache.pop(telegram_id)
+    roster_cache.pop(telegram_id)
+
+
+def update_roster(telegram_id: int, snapshot: GradeSnapshot):
+    """Keep the cached roster unless the snapshot shows a different term"""
+    roster = ClassRoster.from_snapshot(snapshot)
+    if not roster.classes:
+        return
+    current = roster_cache.get(telegram_id)
+    if current is None or current.term != roster.term:
+        roster_cache.set(telegram_id, roster, stored_at=snapshot.fetched_at)
+
+
+def invalidate_roster(telegram_id: int):
+    roster_cache.pop(telegram_id)
+
+
+async def load_roster(telegram_id: int) -> Optional[ClassRoster]:
+    """The cached roster, else one rebuilt from the latest stored snapshot if recent enough"""
+    roster = roster_cache.get(telegram_id)
+    if roster is None:
+        snapshot = await load_latest(telegram_id)
+        if snapshot is not None and time.time() - snapshot.fetched_at < config.ROSTER_CACHE_TTL:
+            update_roster(telegram_id, snapshot)
+            roster = roster_cache.get(telegram_id)
+    return roster
+
+
+def store_prefetched(telegram_id: int, snapshot: GradeSnapshot):
+    prefetch_cache.set(telegram_id, snapshot, stored_at=snapshot.fetched_at)
+
+
+def pop_prefetched(telegram_id: int) -> Optional[GradeSnapshot]:
+    """Take the pre-fetched snapshot for a user, or None if missing or stale"""
+    snapshot = prefetch_cache.get(telegram_id)
+    prefetch_cache.pop(telegram_id)
+    return snapshot
+
+
+def format_age(snapshot: GradeSnapshot) -> str:
+    """Human readable age of a snapshot, e.g. 'just now' or '3 minutes ago'"""
+    minutes = int((time.time() - snapshot.fetched_at) // 60)
+    if minutes < 1:
+        return "just now"
+    if minutes == 1:
+        return "1 minute ago"
+    return f"{minutes} minutes ago"
@@ -2,24 +2,29 @@ from telegram import Update, BotCommand, InlineKeyboardButton, InlineKeyboardMar
 from telegram.constants import ChatAction
 from telegram.error import TelegramError
 from telegram.ext import ContextTypes, Application, ConversationHandler, CommandHandler, MessageHandler, filters, CallbackQueryHandler
-from database import Database
-from bot.scraper import AspenScraper
-from bot.scheduler import fetch_and_notify_user
+from database import get_async_database
+from bot.scraper import AsyncAspenScraper, AspenError, AspenFetchError
+from bot.formatting import render_grades_messages, render_class
+from bot.grade_cache import (
+    get_cached_snapshot, cache_snapshot, invalidate_user_grades, format_age,
+    load_roster, invalidate_roster
+)
+from bot.history import save_snapshot, load_latest
+from bot.scheduler import reschedule_user
+from bot.session_cache import session_cache
+from bot.scrape_queue import scrape_scheduler, PRIORITY_INTERACTIVE
+from bot.placement import placement_planner
+from bot.webhook import webhook_intake
 # Email service removed - Telegram only notifications
 import logging
 import time
 from functools import wraps
 import config
 
-# Configure logging
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO
-)
 logger = logging.getLogger(__name__)
 
-# Initialize database
-db = Database()
+# Shared database; all calls run on a dedicated database thread
+db = get_async_database()
 
 # Conversation states
 (REGISTER_USERNAME, REGISTER_PASSWORD,
@@ -92,7 +97,7 @@ async def setup_commands(application: Application) -> None:
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Send a message when the command /start is issued."""
     chat_id = update.effective_chat.id
-    user = db.get_user(chat_id)
+    user = await db.get_user(chat_id)
 
     if user:
         await update.message.reply_text(
@@ -135,7 +140,7 @@ async def register(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     user_id = update.effective_user.id
 
     # Check if user already exists
-    if db.get_user(user_id):
+    if await db.get_user(user_id):
         await update.message.reply_text(
             "You're already registered! Use /settings to update your information or /grades to check your grades."
         )
@@ -190,9 +195,10 @@ async def register_password(update: Update, context: ContextTypes.DEFAULT_TYPE)
     """Store password and complete registration."""
     password = update.message.text.strip()
     context.user_data['aspen_password'] = password
+    previous_user = await db.get_user(update.effective_user.id)
 
     # Complete registration with Telegram notifications only
-    success = db.add_user(
+    success = await db.add_user(
         telegram_id=update.effective_user.id,
         aspen_username=context.user_data['aspen_username'],
         aspen_password=context.user_data['aspen_password'],
@@ -200,6 +206,13 @@ async def register_password(update: Update, context: ContextTypes.DEFAULT_TYPE)
     )
 
     if success:
+        # Any cached Aspen session or grades belong to the old credentials
+        await session_cache.invalidate(update.effective_user.id)
+        invalidate_user_grades(update.effective_user.id)
+        if previous_user and previous_user['aspen_username'] != context.user_data['aspen_username']:
+            # Stored snapshots (diff baseline, roster, fingerprints) describe the other account
+            await db.delete_grade_snapshots(update.effective_user.id)
+
         # Check if this is an update or new registration
         is_update = context.user_data.get('updating') == 'credentials'
 
@@ -230,8 +243,8 @@ async def start_setup_flow(update: Update, context: ContextTypes.DEFAULT_TYPE):
     random_time = generate_random_notification_time()
 
     # Set default timezone and time
-    db.update_user_timezone(update.effective_user.id, 'America/Chicago')
-    db.update_user_notification_time(update.effective_user.id, random_time)
+    await db.update_user_timezone(update.effective_user.id, 'America/Chicago')
+    await db.update_user_notification_time(update.effective_user.id, random_time)
 
     await update.message.reply_text(
         f"🎉 <b>Registration Complete!</b>\n\n"
@@ -276,7 +289,7 @@ async def setup_timezone_selection(update: Update, context: ContextTypes.DEFAULT
         timezone = query.data.replace("setup_timezone_", "")
 
         # Update user's timezone
-        success = db.update_user_timezone(query.from_user.id, timezone)
+        success = await db.update_user_timezone(query.from_user.id, timezone)
         chat_id = update.effective_chat.id if update.effective_chat else query.from_user.id
 
         if success:
@@ -371,7 +384,7 @@ async def setup_notification_time_input(update: Update, context: ContextTypes.DE
         return SETUP_NOTIFICATION_TIME
 
     # Update user's notification time
-    success = db.update_user_notification_time(update.effective_user.id, time_input)
+    success = await db.update_user_notification_time(update.effective_user.id, time_input)
 
     if success:
         confirmation_text = (
@@ -395,7 +408,7 @@ async def setup_notification_time_input(update: Update, context: ContextTypes.DE
 async def complete_setup(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Complete the setup flow."""
     # Get current settings to show what was set
-    settings = db.get_user_settings(update.effective_user.id)
+    settings = await db.get_user_settings(update.effective_user.id)
     timezone_display = "🇺🇸 Central"  # Default
     notification_time = "15:00"  # Default
 
@@ -442,7 +455,7 @@ async def set_notification_time(update: Update, context: ContextTypes.DEFAULT_TY
         return SET_NOTIFICATION_TIME
 
     # Update user's notification time
-    success = db.update_user_notification_time(update.effective_user.id, time_input)
+    success = await db.update_user_notification_time(update.effective_user.id, time_input)
     chat_id = update.effective_chat.id
 
     if success:
@@ -485,78 +498,33 @@ async def set_notification_time(update: Update, context: ContextTypes.DEFAULT_TY
 async def reschedule_user_job(telegram_id: int, notification_time: str, context: ContextTypes.DEFAULT_TYPE):
     """Reschedule a user's notification job with new time."""
     try:
-        import pytz
-        from datetime import time
-        import random
-
         # Get user data
-        user = db.get_user(telegram_id)
+        user = await db.get_user(telegram_id)
         if not user:
             logger.error(f"User {telegram_id} not found for rescheduling")
             return
 
         # Get user's timezone
-        settings = db.get_user_settings(telegram_id)
+        settings = await db.get_user_settings(telegram_id)
         user_timezone = settings.get('timezone', 'America/Chicago') if settings else 'America/Chicago'
-        tz = pytz.timezone(user_timezone)
-
-        # Parse time (HH:MM format) and add random offset
-        hour, minute = map(int, notification_time.split(':'))
-        logger.info(f"User {telegram_id} - Reschedule: Original notification time: {notification_time} ({hour}:{minute:02d})")
-
-        # Add small random offset to prevent all users hitting at exact same time
-        # Use 0-59 second offset for minimal disruption to user's preferred time
-        random_offset_seconds = random.randint(0, 30)  # 0-30 second offset
-        logger.info(f"User {telegram_id} - Reschedule: Random offset: {random_offset_seconds} seconds")
-
-        # Calculate next run time in user's timezone, then convert to UTC
-        from datetime import datetime, timedelta
-        now = datetime.now(tz)
-        logger.info(f"User {telegram_id} - Reschedule: Current time in user timezone: {now.strftime('%Y-%m-%d %H:%M:%S %Z')}")
-
-        scheduled_datetime = now.replace(hour=hour, minute=minute, second=random_offset_seconds, microsecond=0)
-        logger.info(f"User {telegram_id} - Reschedule: Scheduled datetime in user timezone: {scheduled_datetime.strftime('%Y-%m-%d %H:%M:%S %Z')}")
 
-        # If the scheduled time has already passed today, schedule for tomorrow
-        if scheduled_datetime <= now:
-            scheduled_datetime += timedelta(days=1)
-            logger.info(f"User {telegram_id} - Reschedule: Time has passed today, scheduling for tomorrow: {scheduled_datetime.strftime('%Y-%m-%d %H:%M:%S %Z')}")
+        # Replaces the user's jobs (or tick schedule row) and persists the new slot
+        scheduled_utc = await reschedule_user(context.job_queue, user, notification_time, user_timezone)
 
-        # Convert to UTC for the scheduler (Telegram Bot expects UTC times)
-        scheduled_utc = scheduled_datetime.astimezone(pytz.UTC)
-        logger.info(f"User {telegram_id} - Reschedule: Converted to UTC: {scheduled_utc.strftime('%Y-%m-%d %H:%M:%S %Z')}")
-
-        # Create timezone-naive time object in UTC for the scheduler
-        job_time = time(hour=scheduled_utc.hour, minute=scheduled_utc.minute, second=scheduled_utc.second)
-        logger.info(f"User {telegram_id} - Reschedule: Job time UTC (timezone-naive): {job_time}")
-
-        # Remove existing job
-        job_name = f"grade_check_user_{telegram_id}"
-        try:
-            context.job_queue.scheduler.remove_job(job_name)
-            logger.info(f"User {telegram_id} - Reschedule: Removed existing job")
-        except Exception as e:
-            logger.info(f"User {telegram_id} - Reschedule: No existing job to remove: {e}")
-
-        # Create new job with updated time
-        context.job_queue.run_daily(
-            fetch_and_notify_user,
-            time=job_time,
-            name=job_name,
-            data=user,
-            job_kwargs={'next_run_time': scheduled_utc}
-        )
-
-        logger.info(f"User {telegram_id} - Reschedule: Job scheduled successfully")
-        logger.info(f"User {telegram_id} - Reschedule: Summary: {notification_time} {user_timezone} -> {job_time} UTC (next_run_time: {scheduled_utc.strftime('%Y-%m-%d %H:%M:%S %Z')})")
+        logger.info(f"User {telegram_id} - Reschedule: Summary: {notification_time} {user_timezone} -> "
+                    f"next_run_time: {scheduled_utc.strftime('%Y-%m-%d %H:%M:%S %Z')}")
 
     except Exception as e:
         logger.error(f"Error rescheduling job for user {telegram_id}: {str(e)}", exc_info=True)
 
 async def fetch_grades(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Handler for /grades command - fetches current grades and assignments"""
+    """Handler for /grades command - fetches current grades and assignments.
+
+    Recent results are served from the grade cache; `/grades refresh` skips it.
+    `/grades <class>` fetches a single class using the cached class roster.
+    """
     chat_id = update.effective_chat.id
-    user = db.get_user(chat_id)
+    user = await db.get_user(chat_id)
 
     if not user:
         await update.message.reply_text(
@@ -565,6 +533,116 @@ async def fetch_grades(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
         return
 
+    if context.args and context.args[0].lower() != 'refresh':
+        await _send_class_grades(chat_id, user, " ".join(context.args), context)
+        return
+
+    force_refresh = bool(context.args)
+    if not force_refresh:
+        snapshot = get_cached_snapshot(chat_id)
+        if snapshot:
+            await _send_cached_grades(chat_id, snapshot, context)
+            return
+
+    await _send_fresh_grades(chat_id, user, context)
+
+async def refresh_grades(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle the "Force refresh" button shown under cached grades."""
+    query = update.callback_query
+    await query.answer()
+
+    chat_id = update.effective_chat.id if update.effective_chat else query.from_user.id
+    user = await db.get_user(query.from_user.id)
+    if not user:
+        await context.bot.send_message(
+            chat_id=chat_id,
+            text="❌ You're not registered yet!\n\nPlease use /register to set up your Aspen account first."
+        )
+        return
+
+    try:
+        await query.edit_message_reply_markup(reply_markup=None)
+    except TelegramError as e:
+        logger.warning(f"Failed to remove refresh button for user {query.from_user.id}: {e}")
+
+    await _send_fresh_grades(chat_id, user, context)
+
+async def _send_class_grades(chat_id: int, user, query: str, context: ContextTypes.DEFAULT_TYPE):
+    """Fetch and send one class's assignments without requesting the class list."""
+    roster = await load_roster(chat_id)
+    if roster is None:
+        # Nothing known about this user's classes yet; a full fetch fills the roster
+        await _send_fresh_grades(chat_id, user, context)
+        return
+
+    matches = roster.find(query)
+    if not matches:
+        await context.bot.send_message(
+            chat_id=chat_id,
+            text=f"❓ No class matching \"{query}\". Your classes:\n"
+                 + "\n".join(f"• {entry.course_name}" for entry in roster.classes)
+        )
+        return
+
+    entry = matches[0]
+    await context.bot.send_message(
+        chat_id=chat_id,
+        text=f"Fetching {entry.course_name}... Please wait."
+    )
+
+    try:
+        known = get_cached_snapshot(chat_id) or await load_latest(chat_id)
+        previous = None
+        if known:
+            previous = next((c for c in known.classes if c.schedule_oid == entry.schedule_oid), None)
+
+        scraper = AsyncAspenScraper(user['aspen_username'], user['aspen_password'], session_key=chat_id)
+        try:
+            class_grade = await scrape_scheduler.submit(
+                chat_id, lambda: scraper.fetch_class(entry, previous), priority=PRIORITY_INTERACTIVE
+            )
+        except AspenFetchError:
+            # Aspen no longer knows the class (new term?): start over with a full fetch
+            logger.info(f"User {chat_id} - Roster class {entry.schedule_oid} unknown, refreshing roster")
+            invalidate_roster(chat_id)
+            await _send_fresh_grades(chat_id, user, context)
+            return
+        except AspenError as e:
+            await context.bot.send_message(chat_id=chat_id, text=e.user_message)
+            return
+
+        message = render_class(class_grade)
+        if previous:
+            message += f"🕒 <i>Class average as of {format_age(known)}; assignments fetched just now.</i>"
+        await context.bot.send_message(chat_id=chat_id, text=message, parse_mode='HTML')
+
+    except Exception as e:
+        logger.error(f"Error fetching class grades for user {chat_id}: {e}")
+        await context.bot.send_message(
+            chat_id=chat_id,
+            text="❌ Failed to fetch grades. Please check your credentials and try again."
+        )
+
+async def _send_cached_grades(chat_id: int, snapshot, context: ContextTypes.DEFAULT_TYPE):
+    """Send a cached snapshot with its age and a force refresh button."""
+    for message in render_grades_messages(snapshot):
+        await context.bot.send_message(
+            chat_id=chat_id,
+            text=message,
+            parse_mode='HTML'
+        )
+
+    await context.bot.send_message(
+        chat_id=chat_id,
+        text=f"🕒 <i>These grades were fetched {format_age(snapshot)}.</i>",
+        parse_mode='HTML',
+        reply_markup=InlineKeyboardMarkup([
+            [InlineKeyboardButton("🔄 Force refresh", callback_data="grades_refresh")]
+        ])
+    )
+
+async def _send_fresh_grades(chat_id: int, user, context: ContextTypes.DEFAULT_TYPE):
+    """Scrape Aspen now, cache the result and send it."""
     # Send initial message
     await context.bot.send_message(
         chat_id=chat_id,
@@ -573,8 +651,15 @@ async def fetch_grades(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     try:
         # Initialize scraper with user's credentials
-        scraper = AspenScraper(user['aspen_username'], user['aspen_password'])
-        messages = scraper.fetch_formatted_grades()
+        scraper = AsyncAspenScraper(user['aspen_username'], user['aspen_password'], session_key=chat_id)
+        try:
+            snapshot = await scrape_scheduler.submit(chat_id, scraper.fetch_snapshot, priority=PRIORITY_INTERACTIVE)
+            cache_snapshot(chat_id, snapshot)
+            # Full fetch: gives the next incremental daily scrape a fresh baseline
+            await save_snapshot(chat_id, snapshot)
+            messages = render_grades_messages(snapshot)
+        except AspenError as e:
+            messages = [e.user_message]
 
         # Send all messages
         for message in messages:
@@ -593,7 +678,7 @@ async def fetch_grades(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def settings(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Show user settings and management options."""
     chat_id = update.effective_chat.id
-    user = db.get_user(chat_id)
+    user = await db.get_user(chat_id)
 
     if not user:
         await update.message.reply_text(
@@ -603,7 +688,7 @@ async def settings(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return ConversationHandler.END
 
     # Get user settings to show current notification time and timezone
-    settings = db.get_user_settings(chat_id)
+    settings = await db.get_user_settings(chat_id)
     current_time = settings.get('notification_time', '15:00') if settings else '15:00'
     current_timezone = settings.get('timezone', 'America/Chicago') if settings else 'America/Chicago'
 
@@ -653,7 +738,7 @@ async def settings(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def status(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Show user account status."""
     chat_id = update.effective_chat.id
-    user = db.get_user(chat_id)
+    user = await db.get_user(chat_id)
 
     if not user:
         await update.message.reply_text(
@@ -663,7 +748,7 @@ async def status(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
 
     # Get user settings for notification time and timezone
-    settings = db.get_user_settings(chat_id)
+    settings = await db.get_user_settings(chat_id)
     notification_time = settings.get('notification_time', '15:00') if settings else '15:00'
     user_timezone = settings.get('timezone', 'America/Chicago') if settings else 'America/Chicago'
 
@@ -741,6 +826,8 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "<b>Available Commands:</b>\n"
         "🔐 /register - Set up your Aspen account\n"
         "📊 /grades - Check your current grades\n"
+        "🔄 /grades refresh - Skip recently cached grades\n"
+        "📘 /grades &lt;class&gt; - Refresh a single class\n"
         "⚙️ /settings - Manage your account\n"
         "📊 /status - Check your account status\n"
         "💝 /donate - Support the developer\n"
@@ -805,8 +892,8 @@ async def admin_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def _admin_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Show admin statistics."""
     try:
-        # Get all users
-        all_users = db.get_all_active_users()
+        # Get all users together with their settings (one query)
+        all_users = await db.get_active_users_with_settings()
         total_users = len(all_users)
 
         # Get user settings for analysis
@@ -814,16 +901,15 @@ async def _admin_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
         timezones = {}
 
         for user in all_users:
-            settings = db.get_user_settings(user['telegram_id'])
-            if settings:
+            if user['has_settings']:
                 # Notification time distribution
-                time = settings.get('notification_time', '15:00')
+                time = user['notification_time']
                 hour = int(time.split(':')[0])
                 time_slot = f"{hour:02d}:00-{hour:02d}:59"
                 notification_times[time_slot] = notification_times.get(time_slot, 0) + 1
 
                 # Timezone distribution
-                tz = settings.get('timezone', 'America/Chicago')
+                tz = user['timezone']
                 timezones[tz] = timezones.get(tz, 0) + 1
 
         # Create notification time chart
@@ -854,10 +940,42 @@ async def _admin_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 except:
                     pass
 
+        # Scrape queue health
+        queue_stats = scrape_scheduler.stats()
+        queue_chart = "⏳ <b>Scrape Queue:</b>\n"
+        queue_chart += f"Queued: {queue_stats['queued']}, running: {queue_stats['running']}\n"
+        for name, wait in sorted(queue_stats['waits'].items()):
+            queue_chart += f"{name}: {wait['count']} scrapes, avg wait {wait['avg']:.1f}s, max {wait['max']:.1f}s\n"
+        if config.ENV and not config.SERVERLESS:
+            intake = webhook_intake.stats(context.application.update_queue)
+            queue_chart += (f"Webhook: {intake['received']} received, {intake['duplicates']} duplicates, "
+                            f"{intake['rejected']} rejected, queue {intake['depth']} (max {intake['max_depth']})\n")
+        if config.SCRAPE_WORKERS > 0:
+            job_counts = await db.get_scrape_job_counts()
+            queue_chart += f"Workers ({config.SCRAPE_WORKERS}): " + ", ".join(
+                f"{status} {job_counts.get(status, 0)}" for status in ('queued', 'running', 'done', 'failed')
+            ) + "\n"
+
         message = f"📈 <b>Admin Statistics</b>\n\n"
         message += f"👥 <b>Total Users:</b> {total_users}\n"
         message += f"🆕 <b>New Users (7 days):</b> {recent_users}\n\n"
-        message += time_chart + "\n" + tz_chart
+        # Planned daily job load per UTC minute vs the Aspen rate budget
+        peak_load = placement_planner.peak_load()
+        slot_chart = "🗓 <b>Busiest Job Slots (UTC):</b>\n"
+        for slot, load in placement_planner.busiest_slots():
+            bar = "█" * min(load, 20)  # Max 20 bars
+            slot_chart += f"{slot}: {bar} ({load})\n"
+        slot_chart += f"Peak: {peak_load}/min, budget: {placement_planner.capacity}/min"
+        slot_chart += " ✅\n" if peak_load <= placement_planner.capacity else " ⚠️\n"
+
+        # Outcome of each user's last daily run
+        run_statuses = await db.get_last_run_status_counts()
+        if run_statuses:
+            slot_chart += "Last daily runs: " + ", ".join(
+                f"{status} {count}" for status, count in sorted(run_statuses.items())
+            ) + "\n"
+
+        message += time_chart + "\n" + tz_chart + "\n" + queue_chart + "\n" + slot_chart
 
         await update.message.reply_text(message, parse_mode='HTML')
 
@@ -870,7 +988,7 @@ async def _admin_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def _admin_users(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Show detailed user information."""
     try:
-        all_users = db.get_all_active_users()
+        all_users = await db.get_active_users_with_settings()
 
         if not all_users:
             await update.message.reply_text("📭 No users found.")
@@ -880,9 +998,8 @@ async def _admin_users(update: Update, context: ContextTypes.DEFAULT_TYPE):
         message = f"👥 <b>User Details</b> (showing first 10 of {len(all_users)})\n\n"
 
         for i, user in enumerate(all_users[:10]):
-            settings = db.get_user_settings(user['telegram_id'])
-            timezone = settings.get('timezone', 'America/Chicago') if settings else 'America/Chicago'
-            notification_time = settings.get('notification_time', '15:00') if settings else '15:00'
+            timezone = user['timezone']
+            notification_time = user['notification_time']
 
             # Format created timestamp with timezone
             try:
@@ -960,7 +1077,7 @@ async def _admin_broadcast(update: Update, context: ContextTypes.DEFAULT_TYPE):
     message_text = " ".join(context.args[1:])  # Skip 'broadcast' subcommand
 
     try:
-        all_users = db.get_all_active_users()
+        all_users = await db.get_all_active_users()
         sent_count = 0
         failed_count = 0
 
@@ -994,7 +1111,7 @@ async def _admin_feedback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Show recent feedback messages."""
     try:
         # Get recent feedback (last 10 messages)
-        feedback_list = db.get_feedback(limit=10)
+        feedback_list = await db.get_feedback(limit=10)
 
         if not feedback_list:
             await update.message.reply_text("📭 No feedback messages found.")
@@ -1101,39 +1218,28 @@ async def handle_feedback_message(update: Update, context: ContextTypes.DEFAULT_
     if not context.user_data.get('feedback_in_progress'):
         return
 
-    logger.info("Feedback message handler called")
-
     feedback_text = update.message.text.strip()
-    logger.info(f"Feedback message: {feedback_text[:100]}...")
 
-    # Get user info
     user = update.effective_user
-    user_info = {
-        'id': user.id,
-        'username': user.username,
-        'first_name': user.first_name,
-        'last_name': user.last_name
-    }
-
-    logger.info(f"User info: {user_info}")
+    logger.info(f"Feedback received from user {user.id} ({len(feedback_text)} characters)")
 
     # Save feedback to database
     try:
-        result = db.add_feedback(
+        result = await db.add_feedback(
             user_id=user.id,
             username=user.username or 'Unknown',
             first_name=user.first_name or 'Unknown',
             feedback_type='general',  # Default to general feedback
             message=feedback_text
         )
-        logger.info(f"Database save result: {result}")
+        logger.debug(f"Database save result: {result}")
     except Exception as e:
         logger.error(f"Database save error: {e}")
 
     # Send real-time notification to all admins
     try:
         await _notify_admins_feedback(update, context, user, 'general', feedback_text)
-        logger.info("Admin notifications sent")
+        logger.debug("Admin notifications sent")
     except Exception as e:
         logger.error(f"Admin notification error: {e}")
 
@@ -1145,7 +1251,7 @@ async def handle_feedback_message(update: Update, context: ContextTypes.DEFAULT_
             "We appreciate you taking the time to help us improve the bot! 💙",
             parse_mode='HTML'
         )
-        logger.info("User confirmation sent")
+        logger.debug("User confirmation sent")
     except Exception as e:
         logger.error(f"User confirmation error: {e}")
 
@@ -1209,7 +1315,7 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     elif query.data.startswith("timezone_"):
         timezone = query.data.replace("timezone_", "")
 
-        success = db.update_user_timezone(query.from_user.id, timezone)
+        success = await db.update_user_timezone(query.from_user.id, timezone)
         chat_id = update.effective_chat.id if update.effective_chat else query.from_user.id
 
         if success:
@@ -1283,7 +1389,8 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return SETTINGS_MENU
 
     elif query.data == "confirm_delete":
-        success = db.delete_user(update.effective_user.id)
+        success = await db.delete_user(update.effective_user.id)
+        invalidate_user_grades(update.effective_user.id)
         context.user_data.clear()
         if success:
             await query.edit_message_text(
@@ -0,0 +1,126 @@
+"""Per-user grade history.
+
+Snapshots are stored in grade_snapshots as zlib-compressed canonical JSON with
+a SHA-256 content hash and a format version, so a daily run can be compared
+with the last snapshot the user was sent.
+"""
+import hashlib
+import json
+import logging
+import zlib
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+from bot.models import Assignment, ClassGrade, GradeSnapshot
+from database import get_async_database
+import config
+
+logger = logging.getLogger(__name__)
+
+# Bump when GradeSnapshot.to_dict changes shape; older rows are then ignored
+SNAPSHOT_VERSION = 1
+
+
+def encode_snapshot(snapshot: GradeSnapshot) -> Tuple[str, bytes]:
+    """(content_hash, compressed blob) for a snapshot; fetched_at is not part of either"""
+    raw = json.dumps(snapshot.to_dict(), sort_keys=True, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+    return hashlib.sha256(raw).hexdigest(), zlib.compress(raw)
+
+
+def decode_snapshot(data: bytes, fetched_at: float) -> GradeSnapshot:
+    return GradeSnapshot.from_dict(json.loads(zlib.decompress(data)), fetched_at)
+
+
+@dataclass(frozen=True, slots=True)
+class ClassChanges:
+    """What changed in one class between two snapshots."""
+    course_name: str
+    old_grade: Optional[str]
+    new_grade: Optional[str]
+    old_percentage: Optional[float]
+    new_percentage: Optional[float]
+    new_assignments: Tuple[Assignment, ...] = ()
+    rescored: Tuple[Tuple[Assignment, Assignment], ...] = ()   # (before, after)
+
+    @property
+    def grade_changed(self) -> bool:
+        return (self.old_grade, self.old_percentage) != (self.new_grade, self.new_percentage)
+
+
+@dataclass(frozen=True, slots=True)
+class GradeDiff:
+    changed: Tuple[ClassChanges, ...] = ()
+    added_classes: Tuple[ClassGrade, ...] = ()
+    removed_classes: Tuple[ClassGrade, ...] = ()
+
+    @property
+    def is_empty(self) -> bool:
+        return not (self.changed or self.added_classes or self.removed_classes)
+
+
+def _class_key(class_grade: ClassGrade) -> str:
+    return class_grade.schedule_oid or class_grade.course_name
+
+
+def diff_snapshots(old: GradeSnapshot, new: GradeSnapshot) -> GradeDiff:
+    """Grade changes, new assignments and changed scores from `old` to `new`"""
+    old_classes: Dict[str, ClassGrade] = {_class_key(c): c for c in old.classes}
+    new_classes: Dict[str, ClassGrade] = {_class_key(c): c for c in new.classes}
+
+    changed = []
+    for key, current in new_classes.items():
+        previous = old_classes.get(key)
+        if previous is None:
+            continue
+
+        previous_assignments = {a.key: a for a in previous.assignments}
+        new_assignments = []
+        rescored = []
+        for assignment in current.assignments:
+            before = previous_assignments.get(assignment.key)
+            if before is None:
+                new_assignments.append(assignment)
+            elif (before.score, before.score_percent) != (assignment.score, assignment.score_percent):
+                rescored.append((before, assignment))
+
+        changes = ClassChanges(
+            course_name=current.course_name,
+            old_grade=previous.grade,
+            new_grade=current.grade,
+            old_percentage=previous.percentage,
+            new_percentage=current.percentage,
+            new_assignments=tuple(new_assignments),
+            rescored=tuple(rescored)
+        )
+        if changes.grade_changed or changes.new_assignments or changes.rescored:
+            changed.append(changes)
+
+    return GradeDiff(
+        changed=tuple(changed),
+        added_classes=tuple(c for key, c in new_classes.items() if key not in old_classes),
+        removed_classes=tuple(c for key, c in old_classes.items() if key not in new_classes)
+    )
+
+
+async def save_snapshot(telegram_id: int, snapshot: GradeSnapshot, notified: bool = False):
+    content_hash, data = encode_snapshot(snapshot)
+    await get_async_database().save_grade_snapshot(
+        telegram_id, SNAPSHOT_VERSION, content_hash, data, snapshot.fetched_at,
+        notified=notified, keep=config.GRADE_HISTORY_LIMIT
+    )
+
+
+async def load_latest(telegram_id: int, notified: bool = False) -> Optional[GradeSnapshot]:
+    """The user's latest stored snapshot (the last one sent if `notified`), or None"""
+    row = await get_async_database().get_latest_grade_snapshot(telegram_id, notified=notified)
+    if row is None or row['version'] != SNAPSHOT_VERSION:
+        return None
+    try:
+        return decode_snapshot(row['data'], row['fetched_at'])
+    except (zlib.error, ValueError, KeyError, TypeError) as e:
+        logger.warning(f"Ignoring unreadable grade snapshot for user {telegram_id}: {e}")
+        return None
+
+
+async def load_last_notified(telegram_id: int) -> Optional[GradeSnapshot]:
+    """The last snapshot the user was sent, or None (first run or an older format)"""
+    return await load_latest(telegram_id, notified=True)
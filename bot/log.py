@@ -0,0 +1,65 @@
+import logging
+import threading
+import time
+from collections import Counter
+import config
+
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+
+def configure_logging():
+    """Root level from LOG_LEVEL, then per-logger overrides from LOG_LEVELS"""
+    logging.basicConfig(format=LOG_FORMAT, level=config.LOG_LEVEL)
+    for name, level in config.LOG_LEVELS.items():
+        logging.getLogger(name).setLevel(level)
+
+
+class SampledStats:
+    """Counts and timings for a hot path, logged as one summary line per interval.
+
+    Every `sample_every`-th event is also logged at DEBUG with its metadata
+    (never payloads), so a busy path costs a counter update instead of a log
+    line per event.
+    """
+
+    def __init__(self, name: str, logger: logging.Logger, interval: float, sample_every: int):
+        self.name = name
+        self.logger = logger
+        self.interval = interval
+        self.sample_every = max(1, sample_every)
+        self._lock = threading.Lock()
+        self.total = 0
+        self._reset(time.monotonic())
+
+    def _reset(self, now: float):
+        self._started = now
+        self._kinds = Counter()
+        self._count = 0
+        self._total_ms = 0.0
+        self._max_ms = 0.0
+
+    def record(self, kind: str, duration_ms: float, **meta):
+        with self._lock:
+            self.total += 1
+            self._count += 1
+            self._kinds[kind] += 1
+            self._total_ms += duration_ms
+            self._max_ms = max(self._max_ms, duration_ms)
+            sampled = self.total % self.sample_every == 0
+
+            now = time.monotonic()
+            summary = None
+            if now - self._started >= self.interval:
+                summary = (self._count, now - self._started, dict(self._kinds), self._total_ms / self._count, self._max_ms)
+                self._reset(now)
+
+        if sampled and self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug("%s sample: %s %.1f ms %s", self.name, kind, duration_ms, meta)
+        if summary:
+            count, elapsed, kinds, avg_ms, max_ms = summary
+            self.logger.info(
+                "%s: %d in %.0fs (%s), avg %.1f ms, max %.1f ms",
+                self.name, count, elapsed,
+                ", ".join(f"{kind} {n}" for kind, n in sorted(kinds.items())),
+                avg_ms, max_ms
+            )
@@ -0,0 +1,180 @@
+from dataclasses import dataclass, field
+from typing import Optional, Tuple, Dict, Any
+import hashlib
+import json
+import re
+import time
+
+# academicClasses fields that move when a class's assignments change: the
+# averages, plus any count / last-modified style fields the payload carries
+FINGERPRINT_FIELDS = ('sectionTermAverage', 'percentageValue')
+FINGERPRINT_FIELD_PATTERN = re.compile(r'count|modified|updated|lastchange', re.IGNORECASE)
+
+
+def class_fingerprint(data: Dict[str, Any]) -> str:
+    """Short hash of the class-list fields that change when its assignments do"""
+    fields = {key: data.get(key) for key in FINGERPRINT_FIELDS}
+    fields.update({key: value for key, value in data.items() if FINGERPRINT_FIELD_PATTERN.search(key)})
+    raw = json.dumps(fields, sort_keys=True, default=str)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()[:16]
+
+
+@dataclass(frozen=True, slots=True)
+class Assignment:
+    """A single graded (or not yet graded) assignment."""
+    name: str
+    category: str
+    due_date: Optional[int] = None          # Epoch milliseconds, as returned by Aspen
+    score: Optional[str] = None             # None means "Not graded"
+    score_percent: Optional[float] = None
+
+    @classmethod
+    def from_api(cls, data: Dict[str, Any]) -> "Assignment":
+        """Build an assignment from an /assignments API item."""
+        score = None
+        score_percent = None
+        score_elements = data.get('scoreElements') or []
+        if score_elements:
+            score_info = score_elements[0]
+            if score_info.get('score') is not None:
+                score = f"{score_info.get('score')}"
+                score_percent = score_info.get('scorePercent')
+
+        return cls(
+            name=data.get('name', ''),
+            category=data.get('category', ''),
+            due_date=data.get('dueDate'),
+            score=score,
+            score_percent=score_percent
+        )
+
+    @property
+    def key(self) -> Tuple[str, str, Optional[int]]:
+        """Identity used to match an assignment across snapshots"""
+        return (self.name, self.category, self.due_date)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'name': self.name,
+            'category': self.category,
+            'due_date': self.due_date,
+            'score': self.score,
+            'score_percent': self.score_percent,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Assignment":
+        return cls(**data)
+
+
+@dataclass(frozen=True, slots=True)
+class ClassGrade:
+    """One class from academicClasses together with its assignments."""
+    schedule_oid: Optional[str]
+    course_name: str
+    teacher: str
+    grade: str                              # sectionTermAverage, e.g. "A" or "93.5"
+    percentage: Optional[float] = None      # percentageValue
+    assignments: Tuple[Assignment, ...] = ()
+    fingerprint: Optional[str] = None       # class_fingerprint() of the academicClasses item
+
+    @property
+    def has_grade(self) -> bool:
+        return bool(self.grade or self.percentage)
+
+    @classmethod
+    def from_api(cls, data: Dict[str, Any], assignments=None) -> "ClassGrade":
+        """Build a class from an academicClasses API item and its raw assignments."""
+        return cls(
+            schedule_oid=data.get('studentScheduleOid'),
+            course_name=data.get('courseName', ''),
+            teacher=data.get('teacherName', ''),
+            grade=data.get('sectionTermAverage') or '',
+            percentage=data.get('percentageValue'),
+            assignments=tuple(Assignment.from_api(item) for item in assignments or ()),
+            fingerprint=class_fingerprint(data)
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'schedule_oid': self.schedule_oid,
+            'course_name': self.course_name,
+            'teacher': self.teacher,
+            'grade': self.grade,
+            'percentage': self.percentage,
+            'assignments': [assignment.to_dict() for assignment in self.assignments],
+            'fingerprint': self.fingerprint,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ClassGrade":
+        return cls(
+            schedule_oid=data['schedule_oid'],
+            course_name=data['course_name'],
+            teacher=data['teacher'],
+            grade=data['grade'],
+            percentage=data['percentage'],
+            assignments=tuple(Assignment.from_dict(item) for item in data['assignments']),
+            fingerprint=data.get('fingerprint')
+        )
+
+
+@dataclass(frozen=True, slots=True)
+class GradeSnapshot:
+    """Everything fetched from Aspen for one student at one point in time."""
+    student_name: Optional[str]
+    classes: Tuple[ClassGrade, ...]
+    fetched_at: float = field(default_factory=time.time)
+
+    @property
+    def graded_classes(self) -> Tuple[ClassGrade, ...]:
+        return tuple(class_grade for class_grade in self.classes if class_grade.has_grade)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Content of the snapshot, without fetched_at (see bot.history)"""
+        return {
+            'student_name': self.student_name,
+            'classes': [class_grade.to_dict() for class_grade in self.classes],
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any], fetched_at: float) -> "GradeSnapshot":
+        return cls(
+            student_name=data['student_name'],
+            classes=tuple(ClassGrade.from_dict(item) for item in data['classes']),
+            fetched_at=fetched_at
+        )
+
+
+@dataclass(frozen=True, slots=True)
+class RosterEntry:
+    schedule_oid: str
+    course_name: str
+    teacher: str
+
+
+@dataclass(frozen=True, slots=True)
+class ClassRoster:
+    """A student's classes for the current term, without grades or assignments.
+
+    `term` identifies the set of classes; it changes when a new term starts
+    and the studentScheduleOids change.
+    """
+    term: str
+    classes: Tuple[RosterEntry, ...]
+
+    @classmethod
+    def from_snapshot(cls, snapshot: GradeSnapshot) -> "ClassRoster":
+        classes = tuple(
+            RosterEntry(c.schedule_oid, c.course_name, c.teacher)
+            for c in snapshot.classes
+            if c.schedule_oid
+        )
+        oids = ",".join(sorted(entry.schedule_oid for entry in classes))
+        return cls(term=hashlib.sha1(oids.encode('utf-8')).hexdigest()[:12], classes=classes)
+
+    def find(self, query: str) -> Tuple[RosterEntry, ...]:
+        """Classes whose course name matches `query` (exact match first, then substring)"""
+        query = query.strip().lower()
+        exact = tuple(entry for entry in self.classes if entry.course_name.lower() == query)
+        return exact or tuple(entry for entry in self.classes if query in entry.course_name.lower())
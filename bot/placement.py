@@ -0,0 +1,119 @@
+import logging
+import threading
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, Hashable, List, Tuple
+import config
+
+logger = logging.getLogger(__name__)
+
+MINUTES_PER_DAY = 24 * 60
+
+
+class PlacementPlanner:
+    """Assigns daily jobs to concrete UTC start slots.
+
+    Load is tracked per UTC minute of the day. Each minute can take as many
+    scrapes as the Aspen rate budget allows (`capacity`); a job asking for a
+    full minute is moved to the first minute with room inside its tolerance
+    window (never earlier than requested), or to the least loaded one if the
+    whole window is full. Jobs sharing a minute get evenly spread seconds.
+    """
+
+    def __init__(self, rate_per_minute: float, tolerance_minutes: int):
+        self.capacity = max(1, int(rate_per_minute))
+        self.tolerance_minutes = max(0, tolerance_minutes)
+        self._load: Dict[int, int] = defaultdict(int)
+        self._assignments: Dict[Hashable, int] = {}
+        self._lock = threading.Lock()
+
+    def place(self, key: Hashable, requested: datetime) -> datetime:
+        """Reserve a slot for `key` at or after `requested` (UTC) and return its start time."""
+        with self._lock:
+            self._release(key)
+
+            base = requested.hour * 60 + requested.minute
+            best_offset = None
+            for offset in range(self.tolerance_minutes + 1):
+                load = self._load.get((base + offset) % MINUTES_PER_DAY, 0)
+                if load < self.capacity:
+                    best_offset = offset
+                    break
+                if best_offset is None or load < self._load.get((base + best_offset) % MINUTES_PER_DAY, 0):
+                    best_offset = offset
+
+            slot = (base + best_offset) % MINUTES_PER_DAY
+            second = (self._load.get(slot, 0) * 60 // self.capacity) % 60
+            self._load[slot] += 1
+            self._assignments[key] = slot
+
+        if best_offset:
+            logger.debug(f"Placed {key} {best_offset} minute(s) after requested {requested.strftime('%H:%M')} UTC")
+        return requested.replace(second=0, microsecond=0) + timedelta(minutes=best_offset, seconds=second)
+
+    def place_before(self, key: Hashable, deadline: datetime, lead_minutes: int) -> datetime:
+        """Reserve the least loaded minute in [deadline - lead_minutes, deadline) for `key`.
+
+        Used for pre-fetch jobs, which only need to finish before the
+        notification; ties go to the earliest minute to leave time for retries.
+        """
+        lead_minutes = max(1, lead_minutes)
+        with self._lock:
+            self._release(key)
+
+            base = deadline.hour * 60 + deadline.minute
+            best_offset = min(
+                range(-lead_minutes, 0),
+                key=lambda offset: self._load.get((base + offset) % MINUTES_PER_DAY, 0)
+            )
+            slot = (base + best_offset) % MINUTES_PER_DAY
+            second = (self._load.get(slot, 0) * 60 // self.capacity) % 60
+            self._load[slot] += 1
+            self._assignments[key] = slot
+
+        return deadline.replace(second=0, microsecond=0) + timedelta(minutes=best_offset, seconds=second)
+
+    def reserve(self, key: Hashable, moment: datetime):
+        """Count `key` in the minute of `moment` without searching (slot restored from storage)."""
+        with self._lock:
+            self._release(key)
+            slot = moment.hour * 60 + moment.minute
+            self._load[slot] += 1
+            self._assignments[key] = slot
+
+    def release(self, key: Hashable):
+        """Forget the slot reserved for `key` (job removed or rescheduled)."""
+        with self._lock:
+            self._release(key)
+
+    def _release(self, key: Hashable):
+        slot = self._assignments.pop(key, None)
+        if slot is not None:
+            self._load[slot] -= 1
+            if not self._load[slot]:
+                del self._load[slot]
+
+    def reset(self):
+        with self._lock:
+            self._load.clear()
+            self._assignments.clear()
+
+    def busiest_slots(self, limit: int = 5) -> List[Tuple[str, int]]:
+        """The most loaded UTC minutes as ('HH:MM', jobs), busiest first."""
+        with self._lock:
+            slots = sorted(self._load.items(), key=lambda item: (-item[1], item[0]))[:limit]
+        return [(f"{slot // 60:02d}:{slot % 60:02d}", load) for slot, load in slots]
+
+    def peak_load(self) -> int:
+        with self._lock:
+            return max(self._load.values(), default=0)
+
+
+# Daily jobs get the whole budget, or what the scrape workers have left after
+# the bot process's interactive share
+placement_planner = PlacementPlanner(
+    rate_per_minute=config.ASPEN_SCRAPES_PER_MINUTE * (
+        1.0 - config.INTERACTIVE_SCRAPE_SHARE if config.SCRAPE_WORKERS > 0 else 1.0
+    ),
+    tolerance_minutes=config.SCHEDULE_TOLERANCE_MINUTES
+)
@@ -1,9 +1,10 @@
+import asyncio
+import sys
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
 import config
 from telegram.ext import Application, JobQueue
 from typing import AsyncGenerator
-from bot.handlers import setup_commands
 
 # https://github.com/python-telegram-bot/python-telegram-bot/wiki/Handling-network-errors
 ptb = (
@@ -11,22 +12,55 @@ ptb = (
     .token(config.TELEGRAM_TOKEN)
     .read_timeout(7)
     .get_updates_read_timeout(42)
-    .job_queue(JobQueue())  # Create a new JobQueue instance
+    # Serverless invocations never run scheduled jobs
+    .job_queue(None if config.SERVERLESS else JobQueue())
 )
 if config.ENV:
     ptb = ptb.updater(None)
 ptb = ptb.build()
 
+# Serverless: the Application is initialized once per warm instance, see get_serverless_app()
+_serverless_ready = False
+_serverless_lock = asyncio.Lock()
+
+
+async def get_serverless_app(register_handlers) -> Application:
+    """Return `ptb` with handlers registered and initialized, doing both only on the first call."""
+    global _serverless_ready
+    if not _serverless_ready:
+        async with _serverless_lock:
+            if not _serverless_ready:
+                register_handlers(ptb)
+                await ptb.initialize()
+                _serverless_ready = True
+    return ptb
+
 
 @asynccontextmanager
 async def lifespan(_: FastAPI) -> AsyncGenerator:
+    if config.SERVERLESS:
+        # Nothing to start; commands and the webhook URL persist on Telegram's side
+        # from the last regular startup
+        yield
+        # Only close the transport if an update actually loaded the scraper
+        if 'bot.scraper' in sys.modules:
+            await sys.modules['bot.scraper'].close_async_transport()
+        return
+
+    from bot.handlers import setup_commands
+    from bot.scraper import close_async_transport
+    from bot.worker import start_workers, stop_workers
+
     await setup_commands(ptb)
     if config.WEBHOOK_URL:
         await ptb.bot.set_webhook(
             url=f"{config.WEBHOOK_URL}",
             allowed_updates=['message', 'callback_query']
         )
+    workers = start_workers(config.SCRAPE_WORKERS) if config.SCRAPE_WORKERS > 0 else []
     async with ptb:
         await ptb.start()
         yield
         await ptb.stop()
+    stop_workers(workers)
+    await close_async_transport()
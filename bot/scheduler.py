@@ -1,174 +1,501 @@
 from telegram.ext import Application, ContextTypes
-from bot.scraper import AspenScraper
+from bot.scraper import AsyncAspenScraper, AspenError
+from bot.formatting import render_grades_messages, render_changes_message
+from bot.history import diff_snapshots, load_latest, load_last_notified, save_snapshot
+from bot.session_cache import session_cache
+from bot.grade_cache import get_cached_snapshot, cache_snapshot, store_prefetched, pop_prefetched
+from bot.scrape_queue import scrape_scheduler, PRIORITY_DAILY, PRIORITY_PREFETCH
+from bot.placement import placement_planner, MINUTES_PER_DAY
 # Email service removed - Telegram only notifications
-from database import Database
+from database import get_database, get_async_database
+import asyncio
+import hashlib
+import json
 import logging
+from collections import deque
+from collections.abc import Mapping
+from dataclasses import dataclass
 from datetime import time, datetime, timedelta
+from time import perf_counter
+from typing import Deque, Dict, List, Optional, Tuple
 import pytz
-import asyncio
-import random
 import config
 
 logger = logging.getLogger(__name__)
 
-# Initialize database
-db = Database()
+# Shared database; async_db is used from jobs running on the event loop
+db = get_database()
+async_db = get_async_database()
+session_cache.attach_store(async_db)
+
+# Tick mode (SCHEDULER_MODE=tick)
+TICK_MAX_BACKFILL_MINUTES = 5
+SCHEDULE_REFRESH_INTERVAL = 3600  # seconds; also picks up DST changes
+
+def is_weekend(moment: Optional[datetime] = None) -> bool:
+    """Daily notifications are skipped on Saturday and Sunday, judged in UTC"""
+    return (moment or datetime.now(pytz.UTC)).astimezone(pytz.UTC).weekday() >= 5
+
+async def scrape_daily_snapshot(user, priority: int):
+    """Scrape a user's grades for a daily run and add them to the history.
+
+    With INCREMENTAL_FETCH, classes unchanged since the latest stored snapshot
+    keep its assignments instead of being fetched again.
+    """
+    user_id = user['telegram_id']
+    previous = await load_latest(user_id) if config.INCREMENTAL_FETCH else None
+    scraper = AsyncAspenScraper(user['aspen_username'], user['aspen_password'], session_key=user_id)
+    snapshot = await scrape_scheduler.submit(user_id, lambda: scraper.fetch_snapshot(previous), priority=priority)
+    await save_snapshot(user_id, snapshot)
+    return snapshot
+
+async def prefetch_user(user):
+    """Scrape a user's grades ahead of their notification so the send only has to deliver"""
+    user_id = user['telegram_id']
+    try:
+        # Nothing to prepare when the send this pre-fetch is for will be skipped
+        if is_weekend(datetime.now(pytz.UTC) + timedelta(minutes=config.PREFETCH_LEAD_MINUTES)):
+            return
 
-# Rate limiting and request spacing
-REQUEST_DELAY_MIN = 30  # Minimum 30 seconds between requests
-REQUEST_DELAY_MAX = 60  # Maximum 1 minutes between requests
-MAX_CONCURRENT_REQUESTS = 3  # Maximum concurrent requests to Aspen
+        snapshot = await scrape_daily_snapshot(user, PRIORITY_PREFETCH)
+        store_prefetched(user_id, snapshot)
+        cache_snapshot(user_id, snapshot)
+        logger.info(f"Pre-fetched grades for user {user_id}")
 
-# Global request queue and semaphore
-request_semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
-last_request_time = 0
+    except Exception as e:
+        # The send falls back to a live fetch
+        logger.warning(f"Pre-fetch failed for user {user_id}: {str(e)}")
+
+async def prefetch_user_grades(context: ContextTypes.DEFAULT_TYPE):
+    """Job callback for grade_prefetch_user_{id}"""
+    await prefetch_user(context.job.data)
+
+def prefetch_enabled() -> bool:
+    """Pre-fetched snapshots live in this process's memory, so worker mode scrapes at send time"""
+    return config.PREFETCH_LEAD_MINUTES > 0 and config.SCRAPE_WORKERS <= 0
+
+def plan_user_slots(telegram_id: int, notify_utc: datetime) -> Tuple[datetime, Optional[datetime]]:
+    """Reserve planner slots for a user's notification and return `(send_utc, prefetch_utc)`.
+
+    With pre-fetching enabled the scrape is placed in a low-load minute before
+    the notification and the send goes out at the chosen time. Otherwise the
+    send itself scrapes, so it is placed in a minute with spare capacity and
+    prefetch_utc is None.
+    """
+    if not prefetch_enabled():
+        placement_planner.release(('prefetch', telegram_id))
+        return placement_planner.place(telegram_id, notify_utc), None
+
+    placement_planner.release(telegram_id)
+    return notify_utc, placement_planner.place_before(('prefetch', telegram_id), notify_utc, config.PREFETCH_LEAD_MINUTES)
+
+def remove_jobs_by_name(job_queue, name: str):
+    """Remove a user's existing job; PTB names jobs but gives them random APScheduler ids"""
+    for job in job_queue.get_jobs_by_name(name):
+        job.schedule_removal()
+
+def schedule_prefetch_job(job_queue, user, prefetch_utc: Optional[datetime], replace: bool = True):
+    """(Re)create a user's grade_prefetch_user_{id} job; None just removes it.
+
+    `replace=False` skips looking for an existing job (startup, after remove_all_jobs).
+    """
+    telegram_id = user['telegram_id']
+    prefetch_job_name = f"grade_prefetch_user_{telegram_id}"
+    if replace:
+        remove_jobs_by_name(job_queue, prefetch_job_name)
+
+    if prefetch_utc is None:
+        return
+
+    if prefetch_utc <= datetime.now(pytz.UTC):
+        # Too close to today's notification; it fetches live and pre-fetching starts tomorrow
+        prefetch_utc += timedelta(days=1)
+
+    job_queue.run_daily(
+        prefetch_user_grades,
+        time=time(hour=prefetch_utc.hour, minute=prefetch_utc.minute, second=prefetch_utc.second),
+        name=prefetch_job_name,
+        data=user,
+        job_kwargs={'next_run_time': prefetch_utc}
+    )
+    logger.debug(f"User {telegram_id} - Pre-fetch scheduled at UTC: {prefetch_utc.strftime('%Y-%m-%d %H:%M:%S %Z')}")
+
+def schedule_notification_job(job_queue, user, send_utc: datetime, replace: bool = True):
+    """(Re)create a user's grade_check_user_{id} job, first running at `send_utc`.
+
+    `replace=False` skips looking for an existing job (startup, after remove_all_jobs).
+    """
+    job_name = f"grade_check_user_{user['telegram_id']}"
+    if replace:
+        remove_jobs_by_name(job_queue, job_name)
+
+    job_queue.run_daily(
+        fetch_and_notify_user,
+        time=time(hour=send_utc.hour, minute=send_utc.minute, second=send_utc.second),
+        name=job_name,
+        data=user,  # Pass user data to the job
+        job_kwargs={'next_run_time': send_utc}
+    )
+
+async def notify_user(bot, user, scheduled_time: datetime):
+    """Send a user's daily grades, using pre-fetched data when it is fresh enough.
+
+    `scheduled_time` (aware) is when the send was due; a late send adds a delay notice.
+    The grades are compared with the last snapshot sent (see DAILY_UPDATE_MODE).
+    Returns the run status recorded in notification_schedule ('sent', 'unchanged',
+    'skipped', 'error' when Aspen could not be scraped and the user got the error
+    message, or 'failed').
+    """
+    try:
+        user_id = user['telegram_id']
 
-async def fetch_and_notify_user(context: ContextTypes.DEFAULT_TYPE):
-    """Fetch grades and notify a specific user with rate limiting"""
-    async with request_semaphore:
+        # Log the actual execution time
+        current_time = datetime.now(pytz.UTC)
+        logger.info(f"=== NOTIFICATION EXECUTION ===")
+        logger.info(f"User {user_id} - Executed at: {current_time.strftime('%Y-%m-%d %H:%M:%S %Z')} "
+                    f"(due {scheduled_time.strftime('%H:%M:%S %Z')})")
+
+        # Check if it's a weekend (Saturday = 5, Sunday = 6)
+        if is_weekend(current_time):
+            logger.info(f"Skipping notification for user {user_id} - weekend detected (day {current_time.weekday()})")
+            await _record_run(user_id, 'skipped', scheduled_time)
+            return 'skipped'
+
+        logger.info(f"Processing scheduled grade check for user {user_id}")
+
+        # Get user's timezone and format time in their local timezone
+        settings = await async_db.get_user_settings(user_id)
+        user_timezone = settings.get('timezone', 'America/Chicago') if settings else 'America/Chicago'
+        user_tz = pytz.timezone(user_timezone)
+
+        # Convert current time to user's timezone
+        user_local_time = current_time.astimezone(user_tz)
+        formatted_time = user_local_time.strftime('%A, %B %d, %Y at %I:%M %p %Z')
+
+        snapshot = None
+        status = 'sent'
         try:
-            user_data = context.job.data
-            user_id = user_data['telegram_id']
-            username = user_data['aspen_username']
-            password = user_data['aspen_password']
-
-            # Log the actual execution time
-            current_time = datetime.now()
-            logger.info(f"=== NOTIFICATION EXECUTION ===")
-            logger.info(f"User {user_id} - Job executed at: {current_time.strftime('%Y-%m-%d %H:%M:%S %Z')}")
-            logger.info(f"User {user_id} - Job name: {context.job.name}")
-            logger.info(f"User {user_id} - Job scheduled time: {getattr(context.job, 'scheduled_time', 'Unknown')}")
-
-            # Check if it's a weekend (Saturday = 5, Sunday = 6)
-            if current_time.weekday() >= 5:  # Saturday or Sunday
-                logger.info(f"Skipping notification for user {user_id} - weekend detected (day {current_time.weekday()})")
-                return
-
-            logger.info(f"Processing scheduled grade check for user {user_id} ({username})")
-
-            # Add random delay to prevent simultaneous requests
-            delay = random.uniform(REQUEST_DELAY_MIN, REQUEST_DELAY_MAX)
-            logger.info(f"Waiting {delay:.1f} seconds before request to avoid rate limiting")
-            await asyncio.sleep(delay)
-
-            # Initialize scraper with user's credentials
-            scraper = AspenScraper(username, password)
-
-            # Calculate actual notification time vs scheduled time
-            current_time = datetime.now()
-            scheduled_time = context.job.scheduled_time if hasattr(context.job, 'scheduled_time') else current_time
-
-            # Add delay information to title
-            delay_minutes = int((current_time - scheduled_time).total_seconds() / 60) if current_time > scheduled_time else 0
-
-            # Get user's timezone and format time in their local timezone
-            settings = db.get_user_settings(user_id)
-            user_timezone = settings.get('timezone', 'America/Chicago') if settings else 'America/Chicago'
-            user_tz = pytz.timezone(user_timezone)
-
-            # Convert current time to user's timezone
-            user_local_time = current_time.astimezone(user_tz)
-            formatted_time = user_local_time.strftime('%A, %B %d, %Y at %I:%M %p %Z')
-
-            messages = scraper.fetch_formatted_grades(
-                title=f"📚 Daily Grade Update ({formatted_time})"
+            # Prefer the pre-fetched snapshot, then a very recent manual /grades result
+            snapshot = pop_prefetched(user_id) or get_cached_snapshot(user_id)
+            if snapshot is None:
+                logger.info(f"User {user_id} - No fresh pre-fetched grades, fetching live")
+                snapshot = await scrape_daily_snapshot(user, PRIORITY_DAILY)
+                cache_snapshot(user_id, snapshot)
+
+            # Compare with what the user was sent last time
+            previous = await load_last_notified(user_id)
+            diff = diff_snapshots(previous, snapshot) if previous else None
+
+            if diff is not None and diff.is_empty and config.DAILY_UPDATE_MODE != 'full':
+                logger.info(f"User {user_id} - Grades unchanged since last update, nothing to send")
+                await save_snapshot(user_id, snapshot, notified=True)
+                await _record_run(user_id, 'unchanged', scheduled_time)
+                return 'unchanged'
+
+            messages = []
+            if diff is not None and not diff.is_empty and config.DAILY_UPDATE_MODE != 'full':
+                since = datetime.fromtimestamp(previous.fetched_at, user_tz).strftime('%A, %B %d')
+                messages.append(render_changes_message(diff, f"your last update ({since})"))
+            if not messages or config.DAILY_UPDATE_MODE != 'digest':
+                messages += render_grades_messages(
+                    snapshot,
+                    title=f"📚 Daily Grade Update ({formatted_time})"
+                )
+        except AspenError as e:
+            # The user is told why; the run is recorded as an error, not as sent
+            logger.warning(f"User {user_id} - Daily scrape failed: {e}")
+            messages = [e.user_message]
+            status = 'error'
+
+        # Time spent waiting in the scrape queue and scraping
+        delay_minutes = int((datetime.now(pytz.UTC) - scheduled_time).total_seconds() / 60)
+
+        # Send notifications via Telegram
+        for message in messages:
+            await bot.send_message(
+                chat_id=user_id,
+                text=message,
+                parse_mode='HTML'
             )
 
-            # Send notifications via Telegram
-            for message in messages:
-                await context.bot.send_message(
-                    chat_id=user_id,
-                    text=message,
-                    parse_mode='HTML'
-                )
+        # Send delay explanation if there was a delay
+        if delay_minutes > 0:
+            await bot.send_message(
+                chat_id=user_id,
+                text=f"⏰ <b>Delay Notice</b>\n\n"
+                     f"Your notification was delayed by {delay_minutes} minutes due to rate limiting protection.\n\n"
+                     f"This ensures reliable service for all users by preventing server overload.",
+                parse_mode='HTML'
+            )
 
-            # Send delay explanation if there was a delay
-            if delay_minutes > 0:
-                await context.bot.send_message(
-                    chat_id=user_id,
-                    text=f"⏰ <b>Delay Notice</b>\n\n"
-                         f"Your notification was delayed by {delay_minutes} minutes due to rate limiting protection.\n\n"
-                         f"This ensures reliable service for all users by preventing server overload.",
-                    parse_mode='HTML'
-                )
+        if snapshot is not None:
+            await save_snapshot(user_id, snapshot, notified=True)
 
-            logger.info(f"Sent scheduled update to user {user_id}")
+        logger.info(f"Sent scheduled update to user {user_id} ({status})")
+        await _record_run(user_id, status, scheduled_time)
+        return status
 
-        except Exception as e:
-            logger.error(f"Error in scheduled grade fetch for user {user_data.get('telegram_id', 'unknown')}: {str(e)}", exc_info=True)
+    except Exception as e:
+        logger.error(f"Error in scheduled grade fetch for user {user.get('telegram_id', 'unknown')}: {str(e)}", exc_info=True)
+        await _record_run(user['telegram_id'], 'failed', scheduled_time)
+        return 'failed'
 
-def setup_scheduler(app: Application):
-    """Setup the job queue with individual user grade checking jobs"""
-    # Clear any existing jobs first to prevent duplicates
+async def _record_run(telegram_id: int, status: str, scheduled_time: datetime):
+    """Persist a run's outcome; the next run is due a day after this one"""
     try:
-        app.job_queue.scheduler.remove_all_jobs()
-        logger.info("Cleared existing scheduled jobs")
+        await async_db.record_notification_run(telegram_id, status, (scheduled_time + timedelta(days=1)).timestamp())
     except Exception as e:
-        logger.warning(f"Could not clear existing jobs: {e}")
-
-    # Get timezone
-    tz = pytz.timezone(config.TIMEZONE)
+        logger.warning(f"Could not record {status} run for user {telegram_id}: {e}")
 
-    # Get all active users and their notification times
-    users = db.get_all_active_users()
-    logger.info(f"Setting up scheduled jobs for {len(users)} users")
+async def dispatch_notification(bot, user, scheduled_time: datetime):
+    """Run a due notification in this process, or queue it for the scrape workers (SCRAPE_WORKERS > 0)"""
+    if config.SCRAPE_WORKERS > 0:
+        payload = json.dumps({'scheduled_at': scheduled_time.timestamp()})
+        job_id = await async_db.enqueue_scrape_job(user['telegram_id'], 'notify', payload, PRIORITY_DAILY)
+        logger.debug(f"User {user['telegram_id']} - Queued notify job {job_id}")
+    else:
+        await notify_user(bot, user, scheduled_time)
 
-    for user in users:
+async def fetch_and_notify_user(context: ContextTypes.DEFAULT_TYPE):
+    """Job callback for grade_check_user_{id}"""
+    await dispatch_notification(context.bot, context.job.data, datetime.now(pytz.UTC))
+
+def next_run_utc(notification_time: str, user_timezone: str, now_utc: Optional[datetime] = None) -> datetime:
+    """Next occurrence of `notification_time` (HH:MM) in `user_timezone`, as an aware UTC datetime"""
+    user_tz = pytz.timezone(user_timezone)
+    now = (now_utc or datetime.now(pytz.UTC)).astimezone(user_tz)
+    hour, minute = map(int, notification_time.split(':'))
+
+    # localize() picks the right UTC offset for the target day, even across a DST change
+    scheduled = user_tz.localize(datetime.combine(now.date(), time(hour=hour, minute=minute)))
+    if scheduled <= now:
+        scheduled = user_tz.localize(datetime.combine(now.date() + timedelta(days=1), time(hour=hour, minute=minute)))
+    return scheduled.astimezone(pytz.UTC)
+
+def minute_of_day(moment: datetime) -> int:
+    return moment.hour * 60 + moment.minute
+
+def settings_hash(user_timezone: str, notification_time: str) -> str:
+    """Fingerprint of everything a user's slot depends on; stored rows are reused while it matches"""
+    key = (f"{user_timezone}|{notification_time}|{config.PREFETCH_LEAD_MINUTES if prefetch_enabled() else 0}|"
+           f"{config.SCHEDULE_TOLERANCE_MINUTES}|{placement_planner.capacity}")
+    return hashlib.sha1(key.encode()).hexdigest()[:16]
+
+@dataclass(slots=True)
+class PlannedRun:
+    """One user's next notification as planned by plan_schedule()"""
+    user: Mapping
+    send_utc: datetime
+    prefetch_utc: Optional[datetime]
+    settings_hash: str
+    missed_utc: Optional[datetime] = None  # Due time that passed while the bot was down
+    reused: bool = False
+
+def _restore_run(row, notify_utc: datetime, now_utc: datetime) -> Optional[Tuple[datetime, Optional[datetime]]]:
+    """`(send_utc, prefetch_utc)` from a stored row if it is still upcoming and agrees with `notify_utc`"""
+    if not row['next_run_at']:
+        return None
+
+    send_utc = datetime.fromtimestamp(row['next_run_at'], pytz.UTC)
+    # The planner only ever moves a send later, by at most the tolerance window;
+    # anything else is stale (e.g. the UTC offset changed with DST)
+    if send_utc <= now_utc or not notify_utc <= send_utc < notify_utc + timedelta(minutes=config.SCHEDULE_TOLERANCE_MINUTES + 1):
+        return None
+
+    prefetch_utc = None
+    if row['prefetch_minute'] is not None:
+        lead = (row['utc_minute'] - row['prefetch_minute']) % MINUTES_PER_DAY
+        prefetch_utc = send_utc.replace(second=0, microsecond=0) - timedelta(minutes=lead)
+    return send_utc, prefetch_utc
+
+def plan_schedule(catch_up: bool = False) -> List[PlannedRun]:
+    """Plan every active user's next run, reusing stored rows whose settings did not change.
+
+    Users and settings come from one query and next-run times are computed
+    once per (timezone, notification time) pair. With `catch_up`, runs that
+    were due while the bot was down (no later than CATCHUP_MAX_AGE_MINUTES
+    ago) are reported in `missed_utc`. The result is written back to
+    notification_schedule in one transaction.
+    """
+    placement_planner.reset()
+    now_utc = datetime.now(pytz.UTC)
+    stored = db.get_notification_schedule()
+    next_runs: Dict[Tuple[str, str], datetime] = {}
+
+    plans = []
+    for user in db.get_active_users_with_settings():
         try:
-            # Get user settings
-            settings = db.get_user_settings(user['telegram_id'])
-            notification_time = settings.get('notification_time', '15:00') if settings else '15:00'
-            user_timezone = settings.get('timezone', 'America/Chicago') if settings else 'America/Chicago'
-
-            # Use user's timezone instead of global timezone
-            user_tz = pytz.timezone(user_timezone)
-
-            # Parse time (HH:MM format) and add random offset
-            hour, minute = map(int, notification_time.split(':'))
-            logger.info(f"User {user['telegram_id']} - Original notification time: {notification_time} ({hour}:{minute:02d})")
-
-            # Add small random offset to prevent all users hitting at exact same time
-            # Use 0-59 second offset for minimal disruption to user's preferred time
-            random_offset_seconds = random.randint(0, 30)  # 0-30 second offset
-            logger.info(f"User {user['telegram_id']} - Random offset: {random_offset_seconds} seconds")
-
-            # Create individual job for this user
-            job_name = f"grade_check_user_{user['telegram_id']}"
-
-            # Calculate next run time in user's timezone, then convert to UTC
-            now = datetime.now(user_tz)
-            logger.info(f"User {user['telegram_id']} - Current time in user timezone: {now.strftime('%Y-%m-%d %H:%M:%S %Z')}")
-
-            scheduled_datetime = now.replace(hour=hour, minute=minute, second=random_offset_seconds, microsecond=0)
-            logger.info(f"User {user['telegram_id']} - Scheduled datetime in user timezone: {scheduled_datetime.strftime('%Y-%m-%d %H:%M:%S %Z')}")
-
-            # If the scheduled time has already passed today, schedule for tomorrow
-            if scheduled_datetime <= now:
-                scheduled_datetime += timedelta(days=1)
-                logger.info(f"User {user['telegram_id']} - Time has passed today, scheduling for tomorrow: {scheduled_datetime.strftime('%Y-%m-%d %H:%M:%S %Z')}")
-
-            # Convert to UTC for the scheduler (Telegram Bot expects UTC times)
-            scheduled_utc = scheduled_datetime.astimezone(pytz.UTC)
-            logger.info(f"User {user['telegram_id']} - Converted to UTC: {scheduled_utc.strftime('%Y-%m-%d %H:%M:%S %Z')}")
-
-            # Create timezone-naive time object in UTC for the scheduler
-            job_time_utc = time(hour=scheduled_utc.hour, minute=scheduled_utc.minute, second=scheduled_utc.second)
-            logger.info(f"User {user['telegram_id']} - Job time UTC (timezone-naive): {job_time_utc}")
-
-            # Schedule the job to start at the calculated time
-            app.job_queue.run_daily(
-                fetch_and_notify_user,
-                time=job_time_utc,
-                name=job_name,
-                data=user,  # Pass user data to the job
-                job_kwargs={'next_run_time': scheduled_utc}
-            )
-
-            logger.info(f"User {user['telegram_id']} - Job scheduled successfully")
-            logger.info(f"User {user['telegram_id']} - Summary: {notification_time} {user_timezone} -> {job_time_utc} UTC (next_run_time: {scheduled_utc.strftime('%Y-%m-%d %H:%M:%S %Z')})")
+            telegram_id = user['telegram_id']
+            key = (user['timezone'], user['notification_time'])
+            notify_utc = next_runs.get(key)
+            if notify_utc is None:
+                notify_utc = next_runs[key] = next_run_utc(user['notification_time'], user['timezone'], now_utc)
+
+            fingerprint = settings_hash(user['timezone'], user['notification_time'])
+            row = stored.get(telegram_id)
+            if row is None or row['settings_hash'] != fingerprint:
+                row = None
+
+            missed_utc = None
+            if catch_up and row and row['next_run_at'] and row['next_run_at'] <= now_utc.timestamp():
+                due = datetime.fromtimestamp(row['next_run_at'], pytz.UTC)
+                ran = row['last_run_at'] is not None and row['last_run_at'] >= row['next_run_at']
+                if not ran and now_utc - due <= timedelta(minutes=config.CATCHUP_MAX_AGE_MINUTES):
+                    missed_utc = due
+
+            restored = _restore_run(row, notify_utc, now_utc) if row else None
+            if restored:
+                send_utc, prefetch_utc = restored
+                if prefetch_utc is None:
+                    placement_planner.reserve(telegram_id, send_utc)
+                else:
+                    placement_planner.reserve(('prefetch', telegram_id), prefetch_utc)
+            else:
+                # The scrape is placed in a slot with spare Aspen capacity
+                send_utc, prefetch_utc = plan_user_slots(telegram_id, notify_utc)
+
+            plans.append(PlannedRun(user, send_utc, prefetch_utc, fingerprint, missed_utc, reused=bool(restored)))
 
         except Exception as e:
-            logger.error(f"Error setting up job for user {user['telegram_id']}: {str(e)}")
-            continue
+            logger.error(f"Error planning schedule for user {user['telegram_id']}: {str(e)}")
+
+    db.sync_notification_schedule([_schedule_entry(plan.user['telegram_id'], plan) for plan in plans])
+    return plans
+
+def _schedule_entry(telegram_id: int, plan: PlannedRun) -> tuple:
+    return (
+        telegram_id,
+        minute_of_day(plan.send_utc),
+        minute_of_day(plan.prefetch_utc) if plan.prefetch_utc else None,
+        plan.send_utc.timestamp(),
+        plan.settings_hash
+    )
+
+async def reschedule_user(job_queue, user, notification_time: str, user_timezone: str) -> datetime:
+    """Re-plan one user after a settings change, update their jobs and stored row; returns the send time"""
+    telegram_id = user['telegram_id']
+    send_utc, prefetch_utc = plan_user_slots(telegram_id, next_run_utc(notification_time, user_timezone))
+
+    # The per-minute tick reads the new time from notification_schedule instead, and
+    # serverless instances have no job queue: the stored row is picked up by the next
+    # schedule refresh or restart of the scheduling instance
+    if job_queue is not None and config.SCHEDULER_MODE != 'tick':
+        schedule_prefetch_job(job_queue, user, prefetch_utc)
+        schedule_notification_job(job_queue, user, send_utc)
+
+    plan = PlannedRun(user, send_utc, prefetch_utc, settings_hash(user_timezone, notification_time))
+    await async_db.save_notification_schedule(*_schedule_entry(telegram_id, plan))
+    return send_utc
+
+# Missed runs found at startup, drained at CATCHUP_PER_MINUTE by catch_up_missed_runs
+_catch_up_queue: Deque[Tuple[Mapping, datetime]] = deque()
+
+async def catch_up_missed_runs(context: ContextTypes.DEFAULT_TYPE):
+    for _ in range(min(config.CATCHUP_PER_MINUTE, len(_catch_up_queue))):
+        user, due = _catch_up_queue.popleft()
+        context.application.create_task(dispatch_notification(context.bot, user, due))
+
+    if _catch_up_queue:
+        logger.info(f"{len(_catch_up_queue)} missed notifications still waiting to catch up")
+    else:
+        context.job.schedule_removal()
+
+def schedule_catch_up(app: Application, plans: List[PlannedRun]) -> int:
+    """Queue the missed runs in `plans` (oldest first) and start draining them"""
+    missed = sorted((plan for plan in plans if plan.missed_utc), key=lambda plan: plan.missed_utc)
+    if not missed:
+        return 0
+
+    _catch_up_queue.extend((plan.user, plan.missed_utc) for plan in missed)
+    app.job_queue.run_repeating(catch_up_missed_runs, interval=60, first=5, name="catch_up_missed_runs")
+    return len(missed)
+
+# Start of the last UTC minute handled by notification_tick
+_last_tick_minute: Optional[datetime] = None
+
+async def notification_tick(context: ContextTypes.DEFAULT_TYPE):
+    """Hand users due in the current UTC minute to the scrape scheduler.
+
+    Minutes skipped by a late tick (up to TICK_MAX_BACKFILL_MINUTES) are
+    processed too, so a slow event loop does not drop notifications.
+    """
+    global _last_tick_minute
+    current = datetime.now(pytz.UTC).replace(second=0, microsecond=0)
+    if _last_tick_minute is None or current - _last_tick_minute > timedelta(minutes=TICK_MAX_BACKFILL_MINUTES):
+        _last_tick_minute = current - timedelta(minutes=1)
+
+    while _last_tick_minute < current:
+        _last_tick_minute += timedelta(minutes=1)
+        minute = minute_of_day(_last_tick_minute)
+
+        prefetch_users = await async_db.get_scheduled_users(minute, 'prefetch_minute')
+        for user in prefetch_users:
+            context.application.create_task(prefetch_user(user))
+
+        due_users = await async_db.get_scheduled_users(minute)
+        for user in due_users:
+            context.application.create_task(dispatch_notification(context.bot, user, _last_tick_minute))
+
+        if prefetch_users or due_users:
+            logger.info(f"Tick {_last_tick_minute.strftime('%H:%M')} UTC: "
+                        f"{len(due_users)} notifications, {len(prefetch_users)} pre-fetches")
+
+async def refresh_schedule_job(context: ContextTypes.DEFAULT_TYPE):
+    """Re-sync notification_schedule (tick mode); also moves rows after a DST change"""
+    plans = await asyncio.to_thread(plan_schedule)
+    logger.info(f"Refreshed notification schedule for {len(plans)} users")
+
+def setup_scheduler(app: Application):
+    """Setup the job queue from the persisted schedule.
+
+    Unchanged users keep their stored slot; new or changed ones are planned
+    again, and runs missed during a restart are caught up at
+    CATCHUP_PER_MINUTE. In per_user mode every user gets their own daily
+    jobs, added before the job queue starts so APScheduler registers them as
+    one pending batch; in tick mode a single per-minute job reads due users
+    from notification_schedule.
+    """
+    started = perf_counter()
+
+    # Clear any existing jobs first to prevent duplicates
+    try:
+        app.job_queue.scheduler.remove_all_jobs()
+    except Exception as e:
+        logger.warning(f"Could not clear existing jobs: {e}")
 
-    logger.info(f"Completed scheduling {len(users)} individual grade check jobs")
+    plans = plan_schedule(catch_up=True)
+
+    failed_count = 0
+    if config.SCHEDULER_MODE == 'tick':
+        # First tick at the start of the next minute
+        now = datetime.now(pytz.UTC)
+        app.job_queue.run_repeating(
+            notification_tick,
+            interval=60,
+            first=now.replace(second=0, microsecond=0) + timedelta(minutes=1),
+            name="notification_tick"
+        )
+        app.job_queue.run_repeating(
+            refresh_schedule_job,
+            interval=SCHEDULE_REFRESH_INTERVAL,
+            first=SCHEDULE_REFRESH_INTERVAL,
+            name="notification_schedule_refresh"
+        )
+    else:
+        for plan in plans:
+            try:
+                # All jobs were just removed, so there is nothing to replace
+                schedule_prefetch_job(app.job_queue, plan.user, plan.prefetch_utc, replace=False)
+                schedule_notification_job(app.job_queue, plan.user, plan.send_utc, replace=False)
+                logger.debug(f"User {plan.user['telegram_id']} - {plan.user['notification_time']} {plan.user['timezone']} -> "
+                             f"next run {plan.send_utc.strftime('%Y-%m-%d %H:%M:%S %Z')}")
+            except Exception as e:
+                failed_count += 1
+                logger.error(f"Error setting up job for user {plan.user['telegram_id']}: {str(e)}")
+
+    caught_up = schedule_catch_up(app, plans)
+
+    logger.info(f"Scheduled {len(plans) - failed_count} users in {config.SCHEDULER_MODE} mode "
+                f"({sum(plan.reused for plan in plans)} reused, {failed_count} failed, {caught_up} missed runs to catch up) "
+                f"in {(perf_counter() - started) * 1000:.0f} ms; "
+                f"peak {placement_planner.peak_load()} scrapes per minute, budget {placement_planner.capacity}")
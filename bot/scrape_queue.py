@@ -0,0 +1,169 @@
+import asyncio
+import itertools
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict
+import config
+
+logger = logging.getLogger(__name__)
+
+# Lower value = served first
+PRIORITY_INTERACTIVE = 0   # /grades and the refresh button
+PRIORITY_DAILY = 1         # Scheduled daily notifications
+PRIORITY_PREFETCH = 2      # Pre-fetches ahead of a notification
+
+PRIORITY_NAMES = {
+    PRIORITY_INTERACTIVE: "interactive",
+    PRIORITY_DAILY: "daily",
+    PRIORITY_PREFETCH: "prefetch",
+}
+
+
+def scrape_budget(share: float):
+    """(rate_per_minute, burst, max_concurrent) for `share` of the configured Aspen limits"""
+    share = min(1.0, max(0.0, share))
+    return (
+        config.ASPEN_SCRAPES_PER_MINUTE * share,
+        max(1, int(config.ASPEN_SCRAPE_BURST * share)),
+        max(1, int(config.ASPEN_MAX_CONCURRENT_SCRAPES * share))
+    )
+
+
+def bot_process_share() -> float:
+    """Share of the Aspen budget used by the bot process (all of it without scrape workers)"""
+    return config.INTERACTIVE_SCRAPE_SHARE if config.SCRAPE_WORKERS > 0 else 1.0
+
+
+class TokenBucket:
+    """Token bucket limiting how many scrapes are started against Aspen."""
+
+    def __init__(self, rate_per_minute: float, burst: int):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated_at = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    async def acquire(self):
+        """Wait until a token is available and take it."""
+        while True:
+            self._refill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+@dataclass(order=True)
+class _ScrapeRequest:
+    priority: int
+    sequence: int
+    user_id: int = field(compare=False)
+    factory: Callable[[], Awaitable[Any]] = field(compare=False)
+    future: asyncio.Future = field(compare=False)
+    enqueued_at: float = field(compare=False, default_factory=time.monotonic)
+
+
+class ScrapeScheduler:
+    """Admission control for Aspen scrapes.
+
+    Requests wait in a priority queue (interactive before daily jobs). A
+    single dispatcher starts them when both a concurrency slot and a rate
+    token are free, so waiting for the rate limit never holds a slot that a
+    running scrape could use. Queue wait time is logged per user and
+    aggregated per priority for /admin stats.
+    """
+
+    def __init__(self, rate_per_minute: float, burst: int, max_concurrent: int):
+        self.rate_per_minute = rate_per_minute
+        self.burst = burst
+        self.max_concurrent = max_concurrent
+        self._bucket = TokenBucket(rate_per_minute, burst)
+        self._queue = None
+        self._slots = None
+        self._dispatcher = None
+        self._sequence = itertools.count()
+        self._running = 0
+        self._wait_stats: Dict[int, Dict[str, float]] = {}
+
+    def configure(self, rate_per_minute: float, burst: int, max_concurrent: int):
+        """Change the limits before the first submit (e.g. a worker's share of the budget)."""
+        self.rate_per_minute = rate_per_minute
+        self.burst = burst
+        self.max_concurrent = max_concurrent
+        self._bucket = TokenBucket(rate_per_minute, burst)
+
+    def _ensure_started(self):
+        if self._dispatcher is None or self._dispatcher.done():
+            self._queue = self._queue or asyncio.PriorityQueue()
+            self._slots = self._slots or asyncio.Semaphore(self.max_concurrent)
+            self._dispatcher = asyncio.get_running_loop().create_task(self._dispatch())
+
+    async def submit(self, user_id: int, factory: Callable[[], Awaitable[Any]],
+                     priority: int = PRIORITY_DAILY) -> Any:
+        """Queue `factory()` (e.g. scraper.fetch_snapshot) and return its result once it has run."""
+        self._ensure_started()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put(_ScrapeRequest(priority, next(self._sequence), user_id, factory, future))
+        return await future
+
+    async def _dispatch(self):
+        while True:
+            await self._slots.acquire()
+            await self._bucket.acquire()
+            request = await self._queue.get()
+
+            if request.future.done():
+                # The caller went away while queued
+                self._slots.release()
+                continue
+
+            wait = time.monotonic() - request.enqueued_at
+            self._record_wait(request.priority, wait)
+            logger.info(f"User {request.user_id} - Starting {PRIORITY_NAMES.get(request.priority, request.priority)} "
+                        f"scrape after {wait:.1f}s in queue")
+
+            self._running += 1
+            asyncio.get_running_loop().create_task(self._run(request))
+
+    async def _run(self, request: _ScrapeRequest):
+        try:
+            result = await request.factory()
+            if not request.future.done():
+                request.future.set_result(result)
+        except Exception as e:
+            if not request.future.done():
+                request.future.set_exception(e)
+        finally:
+            self._running -= 1
+            self._slots.release()
+
+    def _record_wait(self, priority: int, wait: float):
+        stats = self._wait_stats.setdefault(priority, {'count': 0, 'total': 0.0, 'max': 0.0})
+        stats['count'] += 1
+        stats['total'] += wait
+        stats['max'] = max(stats['max'], wait)
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth, running scrapes and wait times per priority."""
+        return {
+            'queued': self._queue.qsize() if self._queue else 0,
+            'running': self._running,
+            'waits': {
+                PRIORITY_NAMES.get(priority, str(priority)): {
+                    'count': stats['count'],
+                    'avg': stats['total'] / stats['count'],
+                    'max': stats['max'],
+                }
+                for priority, stats in self._wait_stats.items()
+            }
+        }
+
+
+# Scrape workers reconfigure their copy with their own share, see bot.worker
+scrape_scheduler = ScrapeScheduler(*scrape_budget(bot_process_share()))
@@ -1,27 +1,129 @@
 import requests
-from bs4 import BeautifulSoup
+import httpx
+from bs4 import BeautifulSoup, SoupStrainer
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import html
+import re
 import time
 import json
 import random
+import logging
+import threading
+from contextlib import contextmanager
+from dataclasses import replace
+import config
+from bot.models import GradeSnapshot, ClassGrade, Assignment, class_fingerprint
+from bot.formatting import format_score, render_grades_messages
+from bot.session_cache import session_cache, AspenSession
+
+logger = logging.getLogger(__name__)
+
+BASE_URL = "https://aspen.cps.edu/aspen"
+
+# Rotate user agents to appear more natural
+USER_AGENTS = [
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36',
+    'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36',
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:109.0) Gecko/20100101 Firefox/121.0',
+    'Mozilla/5.0 (Macintosh; Intel Mac OS X 10.15; rv:109.0) Gecko/20100101 Firefox/121.0'
+]
+
+# Elements that only appear on pages served to an authenticated user
+LOGIN_INDICATORS = [
+    "userPreferenceMenu",  # User preferences menu
+    "Log Off",            # Logout link
+    "confirmLogout"       # Logout confirmation function
+]
+
+LOGIN_TOKEN_FIELD = 'org.apache.struts.taglib.html.TOKEN'
+_TOKEN_INPUT_PATTERN = re.compile(
+    r'<input\b[^>]*\bname\s*=\s*["\']?' + re.escape(LOGIN_TOKEN_FIELD) + r'["\'\s/>][^>]*>',
+    re.IGNORECASE
+)
+_VALUE_ATTR_PATTERN = re.compile(r'\bvalue\s*=\s*(?:"([^"]*)"|\'([^\']*)\'|([^\s>]+))', re.IGNORECASE)
+
+
+def extract_login_token(page_text):
+    """The CSRF token of the logon.do form, or None.
+
+    A regex over the raw HTML finds the one hidden input we need without
+    building a tree; unusual markup falls back to BeautifulSoup restricted
+    (SoupStrainer) to that input.
+    """
+    match = _TOKEN_INPUT_PATTERN.search(page_text)
+    if match:
+        value = _VALUE_ATTR_PATTERN.search(match.group(0))
+        if value:
+            return html.unescape(next(group for group in value.groups() if group is not None))
+
+    token_input = BeautifulSoup(
+        page_text, 'html.parser', parse_only=SoupStrainer('input', attrs={'name': LOGIN_TOKEN_FIELD})
+    ).find('input')
+    return token_input.get('value') if token_input else None
+
+
+# Connection pool shared by every AsyncAspenScraper. Each scraper gets its own
+# client (and therefore its own cookie jar), but they all reuse these sockets.
+_async_transport = None
+
+
+def get_async_transport() -> httpx.AsyncHTTPTransport:
+    """Return the process-wide transport used for all async Aspen requests."""
+    global _async_transport
+    if _async_transport is None:
+        http2 = config.ASPEN_HTTP2
+        if http2:
+            try:
+                import h2  # noqa: F401
+            except ImportError:
+                logger.warning("h2 is not installed, falling back to HTTP/1.1 for Aspen requests")
+                http2 = False
+
+        _async_transport = httpx.AsyncHTTPTransport(
+            http2=http2,
+            limits=httpx.Limits(
+                max_connections=config.ASPEN_MAX_CONNECTIONS,
+                max_keepalive_connections=config.ASPEN_MAX_KEEPALIVE,
+                keepalive_expiry=config.ASPEN_KEEPALIVE_EXPIRY
+            ),
+            retries=1
+        )
+    return _async_transport
 
 
-class AspenScraper:
-    def __init__(self, username=None, password=None):
-        self.session = requests.Session()
-        self.base_url = "https://aspen.cps.edu/aspen"
-
-        # Rotate user agents to appear more natural
-        user_agents = [
-            'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-            'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36',
-            'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-            'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36',
-            'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:109.0) Gecko/20100101 Firefox/121.0',
-            'Mozilla/5.0 (Macintosh; Intel Mac OS X 10.15; rv:109.0) Gecko/20100101 Firefox/121.0'
-        ]
+async def close_async_transport():
+    """Close the shared connection pool (called on application shutdown)."""
+    global _async_transport
+    if _async_transport is not None:
+        await _async_transport.aclose()
+        _async_transport = None
+
+
+class AspenError(Exception):
+    """Base class for failures talking to Aspen."""
+
+    # Text shown to the user when this error ends a fetch
+    user_message = "❌ Failed to fetch grades."
+
 
+class AspenLoginError(AspenError):
+    user_message = "❌ Failed to login to Aspen. Please check credentials."
+
+
+class AspenFetchError(AspenError):
+    user_message = "❌ Failed to fetch classes."
+
+
+class _AspenScraperBase:
+    """State and formatting shared by the blocking and async scrapers."""
+
+    def __init__(self, username=None, password=None):
+        self.base_url = BASE_URL
         self.headers = {
-            'User-Agent': random.choice(user_agents),
+            'User-Agent': random.choice(USER_AGENTS),
             'Accept': 'application/json, text/plain, */*',
             'Accept-Language': 'en-US,en;q=0.5',
             'X-Requested-With': 'XMLHttpRequest',
@@ -29,146 +131,74 @@ class AspenScraper:
             'Pragma': 'no-cache'
         }
         self.student_id = None
+        self.student_name = None
         self.username = username
         self.password = password
+        self.session_key = None
+
+        # Per-scrape counters for the summary log line
+        self._requests = 0
+        self._bytes = 0
+        self._stats_lock = threading.Lock()
 
         if not self.username or not self.password:
             raise ValueError("Username and password are required")
 
-    @staticmethod
-    def format_score(score_text, percentage=None):
-        """Helper function to format score with emoji indicators"""
+    format_score = staticmethod(format_score)
+
+    def _track(self, response):
+        """Count a response (and any redirects before it) for the scrape summary"""
+        with self._stats_lock:
+            self._requests += 1 + len(response.history)
+            self._bytes += len(response.content)
+
+    @contextmanager
+    def _scrape_summary(self, what):
+        """Log one INFO line per scrape: user, outcome, requests, bytes and time"""
+        with self._stats_lock:
+            self._requests = 0
+            self._bytes = 0
+        started = time.perf_counter()
+        outcome = "ok"
         try:
-            if percentage is not None:
-                score = float(percentage)
-                if score >= 90:
-                    return f'☘️ <b>{score_text}</b>'  # Green checkmark for good scores
-                elif score >= 80:
-                    return f'⚠️ <b>{score_text}</b>'  # Warning symbol for scores between 80 and 89
-                else:
-                    return f'‼️ <b>{score_text}</b>'  # Red cross for scores below 80
-        except (ValueError, TypeError):
-            pass
-        return score_text
+            yield
+        except BaseException as e:
+            outcome = type(e).__name__
+            raise
+        finally:
+            logger.info(
+                "%s for user %s: %s, %d requests, %d bytes, %.0f ms",
+                what, self.session_key if self.session_key is not None else "-", outcome, self._requests, self._bytes,
+                (time.perf_counter() - started) * 1000
+            )
 
-    def format_grades_message(self, class_list, title="📚 Current Grades"):
-        """Format grades and assignments into a consistent message format"""
-        messages = []
-        current_message = title
-
-        if hasattr(self, 'student_name') and self.student_name:
-            current_message += f" for {self.student_name}"
-        current_message += ":\n\n"
+    @staticmethod
+    def _graded_schedule_oids(class_list, skip=()):
+        """Schedule OIDs of the classes whose assignments should be fetched"""
+        return [
+            class_info.get('studentScheduleOid')
+            for class_info in class_list
+            if class_info.get('percentageValue') and class_info.get('studentScheduleOid')
+            and class_info.get('studentScheduleOid') not in skip
+        ]
 
-        has_content = False
-        summary_lines = []
+    @staticmethod
+    def _reusable_assignments(class_list, previous):
+        """Assignments from `previous` for classes whose fingerprint has not moved"""
+        if previous is None:
+            return {}
 
+        known = {c.schedule_oid: c for c in previous.classes if c.schedule_oid and c.fingerprint}
+        reusable = {}
         for class_info in class_list:
-            course_name = class_info.get('courseName', '')
-            grade = class_info.get('sectionTermAverage', '')
-            percentage = class_info.get('percentageValue')
-            teacher = class_info.get('teacherName', '')
-
-            # Skip if no grade and no assignments
-            if not grade and not class_info.get('percentageValue'):
-                continue
-
-            has_content = True
-
-            # Collect summary information
-            summary_lines.append(f"📘 {course_name}: {self.format_score(grade or 'No grade', percentage)}")
-
-            class_message = f"📘 <b>{course_name}</b>\n"
-            class_message += "------------------------------\n"
-            class_message += f"Grade: {self.format_score(grade or 'No grade', percentage)}\n"
-            class_message += f"Teacher: {teacher}\n"
-
-            # Get assignments if available
-            if class_info.get('percentageValue'):
-                schedule_oid = class_info.get('studentScheduleOid')
-                if schedule_oid:
-                    assignments = self.get_grade_details(schedule_oid)
-                    if assignments:
-                        # Sort assignments by date (most recent first)
-                        sorted_assignments = sorted(
-                            assignments,
-                            key=lambda x: x.get('dueDate', 0),
-                            reverse=True
-                        )
-
-                        class_message += "\nAssignments:\n"
-                        for assignment in sorted_assignments:
-                            name = assignment.get('name', '')
-                            category = assignment.get('category', '')
-                            due_date = assignment.get('dueDate')
-
-                            # Format date
-                            date_str = ''
-                            if due_date:
-                                date_str = time.strftime('%Y-%m-%d', time.localtime(due_date/1000))
-
-                            # Get score
-                            score_elements = assignment.get('scoreElements', [])
-                            score = "Not graded"
-                            score_percentage = None
-                            if score_elements:
-                                score_info = score_elements[0]
-                                if score_info.get('score') is not None:
-                                    score = f"{score_info.get('score')}"
-                                    score_percentage = score_info.get('scorePercent')
-
-                            class_message += f"• <i>{name}</i>\n"
-                            class_message += f"  📅 Due: {date_str}\n"
-                            class_message += f"  📝 {category}: {self.format_score(score, score_percentage)}\n"
-
-            class_message += "\n"
-
-            # If adding this class would make the message too long, start a new message
-            if len(current_message + class_message) > 3000:
-                messages.append(current_message)
-                current_message = class_message
-            else:
-                current_message += class_message
-
-        # Add summary to the last message if there are classes with grades
-        if summary_lines and has_content:
-            summary_section = "\n📊 <b>Grade Summary:</b>\n" + "------------------------------\n" + "\n".join(summary_lines) + "\n"
-
-            # Check if adding summary would make message too long
-            if len(current_message + summary_section) > 3000:
-                messages.append(current_message)
-                current_message = summary_section
-            else:
-                current_message += summary_section
-
-        # Add the last message if it has content
-        if current_message and has_content:
-            messages.append(current_message)
-        elif not has_content:
-            messages.append("No grades or assignments found for the current term.")
-
-        return messages
-
-    def fetch_formatted_grades(self, title="📚 Current Grades"):
-        """Fetch grades and return formatted messages"""
-        if not self.login():
-            return ["❌ Failed to login to Aspen. Please check credentials."]
-
-        class_list = self.get_class_list()
-        if not class_list:
-            return ["❌ Failed to fetch classes."]
-
-        return self.format_grades_message(class_list, title)
-
-    def login(self):
-        # Get CSRF token
-        login_page = self.session.get(f"{self.base_url}/logon.do")
-        soup = BeautifulSoup(login_page.text, 'html.parser')
-        token = soup.find('input', {'name': 'org.apache.struts.taglib.html.TOKEN'})['value']
-
-        # Login
-        login_payload = {
-            'org.apache.struts.taglib.html.TOKEN': token,
+            prior = known.get(class_info.get('studentScheduleOid'))
+            if prior is not None and prior.fingerprint == class_fingerprint(class_info):
+                reusable[prior.schedule_oid] = prior.assignments
+        return reusable
+
+    def _login_payload(self, token):
+        return {
+            LOGIN_TOKEN_FIELD: token,
             'userEvent': '930',
             'userParam': '',
             'operationId': '',
@@ -183,126 +213,405 @@ class AspenScraper:
             'submit': 'Log On'
         }
 
+    def _build_snapshot(self, class_list, assignments_by_oid, reused=None):
+        """Combine the class list and fetched (or `reused`, already parsed) assignments into a GradeSnapshot"""
+        reused = reused or {}
+        classes = []
+        for class_info in class_list:
+            schedule_oid = class_info.get('studentScheduleOid')
+            class_grade = ClassGrade.from_api(class_info, assignments_by_oid.get(schedule_oid))
+            if schedule_oid in reused:
+                class_grade = replace(class_grade, assignments=reused[schedule_oid])
+            elif schedule_oid in assignments_by_oid and assignments_by_oid[schedule_oid] is None:
+                # The assignment fetch failed: no fingerprint, so the next run fetches it again
+                class_grade = replace(class_grade, fingerprint=None)
+            classes.append(class_grade)
+
+        return GradeSnapshot(student_name=self.student_name, classes=tuple(classes))
+
+
+class AspenScraper(_AspenScraperBase):
+    def __init__(self, username=None, password=None):
+        super().__init__(username, password)
+        self.session = requests.Session()
+        self.session.hooks['response'].append(lambda response, *args, **kwargs: self._track(response))
+
+    def fetch_assignments(self, class_list, skip=()):
+        """Fetch assignments for every graded class not in `skip`, several classes at a time"""
+        schedule_oids = self._graded_schedule_oids(class_list, skip)
+        if not schedule_oids:
+            return {}
+
+        workers = max(1, min(config.ASPEN_CLASS_FETCH_CONCURRENCY, len(schedule_oids)))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = executor.map(self.get_grade_details, schedule_oids)
+            return dict(zip(schedule_oids, results))
+
+    def format_grades_message(self, class_list, title="📚 Current Grades"):
+        """Format grades and assignments into a consistent message format"""
+        snapshot = self._build_snapshot(class_list, self.fetch_assignments(class_list))
+        return render_grades_messages(snapshot, title)
+
+    def fetch_snapshot(self, previous=None):
+        """Log in and fetch all classes and assignments as a GradeSnapshot.
+
+        With a `previous` snapshot, assignments are only fetched for classes
+        whose fingerprint changed; the others keep their previous assignments.
+        """
+        with self._scrape_summary("Scrape"):
+            if not self.login():
+                raise AspenLoginError("Login failed")
+
+            class_list = self.get_class_list()
+            if not class_list:
+                raise AspenFetchError("No classes returned")
+
+            reused = self._reusable_assignments(class_list, previous)
+            if reused:
+                logger.debug("Reusing assignments for %d unchanged classes", len(reused))
+            return self._build_snapshot(class_list, self.fetch_assignments(class_list, skip=reused), reused)
+
+    def fetch_formatted_grades(self, title="📚 Current Grades"):
+        """Fetch grades and return formatted messages"""
+        try:
+            snapshot = self.fetch_snapshot()
+        except AspenError as e:
+            return [e.user_message]
+
+        return render_grades_messages(snapshot, title)
+
+    def login(self):
+        # Get CSRF token
+        login_page = self.session.get(f"{self.base_url}/logon.do")
+        token = extract_login_token(login_page.text)
+        if token is None:
+            logger.warning("Login page did not contain a CSRF token")
+            return False
+
         # First login request
         response = self.session.post(
             f"{self.base_url}/logon.do",
-            data=login_payload,
+            data=self._login_payload(token),
             headers=self.headers
         )
-
-        print(f"Login response status: {response.status_code}")
+        logger.debug("Login response status: %s", response.status_code)
 
         # After login, try to access the home page
         home_response = self.session.get(f"{self.base_url}/home.do", headers=self.headers)
 
-        # Parse the home page response
-        soup = BeautifulSoup(home_response.text, 'html.parser')
-
-        # Look for elements that indicate successful login
-        login_indicators = [
-            "userPreferenceMenu",  # User preferences menu
-            "Log Off",            # Logout link
-            "confirmLogout"       # Logout confirmation function
-        ]
-
         page_text = home_response.text
-        if any(indicator in page_text for indicator in login_indicators):
-            print("Login successful - Found authenticated page elements")
+        if any(indicator in page_text for indicator in LOGIN_INDICATORS):
+            logger.debug("Login successful - found authenticated page elements")
 
             # Get student ID from API instead of hardcoding
             if self.get_student_id():
                 return True
-            else:
-                print("Failed to get student ID")
-                return False
-        else:
-            print("Login failed - Could not find authenticated page elements")
-            if "Invalid login" in page_text:
-                print("Reason: Invalid credentials")
-            elif "Log On" in page_text:
-                print("Reason: Still seeing login page")
+            logger.warning("Login succeeded but no student ID was returned")
             return False
 
+        if "Invalid login" in page_text:
+            logger.info("Login failed - invalid credentials")
+        elif "Log On" in page_text:
+            logger.info("Login failed - still seeing the login page")
+        else:
+            logger.info("Login failed - could not find authenticated page elements")
+        return False
+
+    def _get_json(self, url, params=None, what="data"):
+        """GET a REST endpoint and decode its JSON body, or return None"""
+        response = self.session.get(url, params=params, headers=self.headers)
+
+        if response.status_code != 200:
+            logger.warning("Failed to get %s. Status code: %s", what, response.status_code)
+            return None
+
+        try:
+            return response.json()
+        except json.JSONDecodeError as e:
+            # Never log the body: it can contain the student's data
+            logger.warning("Failed to parse %s JSON response (%d bytes): %s", what, len(response.content), e)
+            return None
+
     def get_student_id(self):
         """Get the student ID from the users/students API"""
         if not self.student_id:
-            url = f"{self.base_url}/rest/users/students"
-            response = self.session.get(url, headers=self.headers)
-
-            if response.status_code == 200:
-                try:
-                    students_data = response.json()
-                    if students_data and len(students_data) > 0:
-                        student = students_data[0]  # Get first student
-                        self.student_id = student.get('studentOid')
-                        self.student_name = student.get('name')
-                        print(f"Found student: {self.student_name}")
-                        print(f"Student ID: {self.student_id}")
-                    else:
-                        print("No student data found in response")
-                except json.JSONDecodeError as e:
-                    print(f"Failed to parse student data JSON response: {e}")
-                    print("Response content:")
-                    print(response.text)
-            else:
-                print(f"Failed to get student data. Status code: {response.status_code}")
+            students_data = self._get_json(f"{self.base_url}/rest/users/students", what="student data")
+            if students_data:
+                student = students_data[0]  # Get first student
+                self.student_id = student.get('studentOid')
+                self.student_name = student.get('name')
+                logger.debug("Found student data (%d students)", len(students_data))
+            elif students_data is not None:
+                logger.warning("No student data found in response")
 
         return self.student_id
 
     def get_class_list(self):
         """Get the list of all classes"""
         student_id = self.get_student_id()
-        url = f"{self.base_url}/rest/students/{student_id}/academicClasses"
-        params = {
-            'gradeTerm': 'current',
-            'year': 'current'
-        }
-
-        print(f"Requesting classes from: {url}")
-        response = self.session.get(url, params=params, headers=self.headers)
-        print(f"Response status: {response.status_code}")
-        print(f"Response headers: {dict(response.headers)}")
-
-        if response.status_code == 200:
-            try:
-                classes_data = response.json()
-                print("Class list retrieved successfully")
-                print(f"Number of classes found: {len(classes_data)}")
-                return classes_data
-            except json.JSONDecodeError as e:
-                print(f"Failed to parse class list JSON response: {e}")
-                print("Response content:")
-                print(response.text)
-                return None
-        else:
-            print(f"Failed to get class list. Status code: {response.status_code}")
-            return None
+        classes_data = self._get_json(
+            f"{self.base_url}/rest/students/{student_id}/academicClasses",
+            params={'gradeTerm': 'current', 'year': 'current'},
+            what="class list"
+        )
+        if classes_data is not None:
+            logger.debug("Class list retrieved (%d classes)", len(classes_data))
+        return classes_data
 
     def get_grade_details(self, schedule_oid):
         """Get details for a specific course's assignments"""
-        url = f"{self.base_url}/rest/studentSchedule/{schedule_oid}/assignments"
-        params = {
-            'gradeTerm': 'current',
-            'year': 'current'
-        }
+        details_data = self._get_json(
+            f"{self.base_url}/rest/studentSchedule/{schedule_oid}/assignments",
+            params={'gradeTerm': 'current', 'year': 'current'},
+            what="assignments"
+        )
+        if details_data is not None:
+            logger.debug("Assignments retrieved (%d items)", len(details_data))
+        return details_data
+
+
+class AsyncAspenScraper(_AspenScraperBase):
+    """Non-blocking AspenScraper for use inside the bot's event loop.
+
+    Every instance has its own cookie jar but sends its requests through the
+    shared transport returned by get_async_transport(), so logins and grade
+    fetches for different users reuse the same pooled (HTTP/2) connections.
+    The client is intentionally never closed here: closing it would close the
+    shared pool. Use close_async_transport() on shutdown instead.
+
+    When `session_key` (the user's telegram_id) is given, authenticated
+    sessions are reused through session_cache and a fresh login only happens
+    when Aspen reports the cached session as expired.
+    """
+
+    def __init__(self, username=None, password=None, session_key=None):
+        super().__init__(username, password)
+        self.session_key = session_key
+        self.client = httpx.AsyncClient(
+            transport=get_async_transport(),
+            follow_redirects=True,
+            timeout=config.ASPEN_TIMEOUT
+        )
+        self._session_generation = 0
+        self._relogin_lock = asyncio.Lock()
 
-        print(f"Requesting assignments for course: {url}")
-        response = self.session.get(url, params=params, headers=self.headers)
+    async def fetch_assignments(self, class_list, skip=()):
+        """Fetch assignments for every graded class not in `skip` concurrently.
 
-        if response.status_code == 200:
-            try:
-                details_data = response.json()
-                print(f"Assignment details retrieved successfully")
-                return details_data
-            except json.JSONDecodeError as e:
-                print(f"Failed to parse assignments JSON response: {e}")
-                print("Response content:")
-                print(response.text)
-                return None
+        At most ASPEN_CLASS_FETCH_CONCURRENCY requests are in flight for this
+        user at once; the result is only returned once every class is done.
+        """
+        schedule_oids = self._graded_schedule_oids(class_list, skip)
+        semaphore = asyncio.Semaphore(max(1, config.ASPEN_CLASS_FETCH_CONCURRENCY))
+
+        async def fetch_one(schedule_oid):
+            async with semaphore:
+                return await self.get_grade_details(schedule_oid)
+
+        results = await asyncio.gather(*(fetch_one(oid) for oid in schedule_oids))
+        return dict(zip(schedule_oids, results))
+
+    async def format_grades_message(self, class_list, title="📚 Current Grades"):
+        """Format grades and assignments into a consistent message format"""
+        snapshot = self._build_snapshot(class_list, await self.fetch_assignments(class_list))
+        return render_grades_messages(snapshot, title)
+
+    async def fetch_snapshot(self, previous=None):
+        """Log in and fetch all classes and assignments as a GradeSnapshot.
+
+        With a `previous` snapshot, assignments are only fetched for classes
+        whose fingerprint changed; the others keep their previous assignments.
+        """
+        with self._scrape_summary("Scrape"):
+            if not await self.ensure_session():
+                raise AspenLoginError("Login failed")
+
+            class_list = await self.get_class_list()
+            if not class_list:
+                raise AspenFetchError("No classes returned")
+
+            reused = self._reusable_assignments(class_list, previous)
+            if reused:
+                logger.debug("User %s - Reusing assignments for %d unchanged classes", self.session_key, len(reused))
+            return self._build_snapshot(class_list, await self.fetch_assignments(class_list, skip=reused), reused)
+
+    async def fetch_class(self, entry, previous=None):
+        """Fetch one class's assignments without the class list (ClassRoster fast path).
+
+        `entry` is a RosterEntry; the average is not part of /assignments, so it
+        is taken from `previous` (the class in an earlier snapshot) when given.
+        Raises AspenFetchError when Aspen does not know the class (e.g. a new term).
+        """
+        with self._scrape_summary("Single-class scrape"):
+            if not await self.ensure_session():
+                raise AspenLoginError("Login failed")
+
+            assignments = await self.get_grade_details(entry.schedule_oid)
+            if assignments is None:
+                raise AspenFetchError(f"No assignments returned for {entry.schedule_oid}")
+
+        return ClassGrade(
+            schedule_oid=entry.schedule_oid,
+            course_name=entry.course_name,
+            teacher=entry.teacher,
+            grade=previous.grade if previous else '',
+            percentage=previous.percentage if previous else None,
+            assignments=tuple(Assignment.from_api(item) for item in assignments),
+            fingerprint=previous.fingerprint if previous else None
+        )
+
+    async def fetch_formatted_grades(self, title="📚 Current Grades"):
+        """Fetch grades and return formatted messages"""
+        try:
+            snapshot = await self.fetch_snapshot()
+        except AspenError as e:
+            return [e.user_message]
+
+        return render_grades_messages(snapshot, title)
+
+    async def ensure_session(self):
+        """Restore this user's cached Aspen session, or log in and cache a new one"""
+        if self.session_key is not None:
+            session = await session_cache.get(self.session_key, self.username)
+            if session is not None:
+                for cookie in session.cookies:
+                    self.client.cookies.set(cookie['name'], cookie['value'], domain=cookie['domain'], path=cookie['path'])
+                self.student_id = session.student_id
+                self.student_name = session.student_name
+                return True
+
+        if not await self.login():
+            return False
+        await self._save_session()
+        return True
+
+    async def _save_session(self):
+        if self.session_key is None:
+            return
+
+        cookies = [
+            {'name': cookie.name, 'value': cookie.value, 'domain': cookie.domain, 'path': cookie.path}
+            for cookie in self.client.cookies.jar
+        ]
+        await session_cache.put(self.session_key, AspenSession(
+            username=self.username,
+            student_id=self.student_id,
+            student_name=self.student_name,
+            cookies=cookies
+        ))
+
+    @staticmethod
+    def _is_session_expired(response):
+        """Aspen answers requests on an expired session with 401 or a redirect to the login page"""
+        return response.status_code == 401 or response.url.path.endswith('/logon.do')
+
+    async def _renew_session(self, generation):
+        """Log in again after an expired session; concurrent callers share one login"""
+        async with self._relogin_lock:
+            if generation != self._session_generation:
+                # Another request already renewed the session while we waited
+                return True
+
+            logger.info("Aspen session expired for user %s, logging in again", self.session_key)
+            if self.session_key is not None:
+                await session_cache.invalidate(self.session_key)
+            self.client.cookies.clear()
+            self.student_id = None
+
+            if not await self.login():
+                return False
+            await self._save_session()
+            self._session_generation += 1
+            return True
+
+    async def login(self):
+        # Get CSRF token
+        login_page = await self.client.get(f"{self.base_url}/logon.do")
+        self._track(login_page)
+        token = extract_login_token(login_page.text)
+        if token is None:
+            logger.warning("Login page did not contain a CSRF token")
+            return False
+
+        response = await self.client.post(
+            f"{self.base_url}/logon.do",
+            data=self._login_payload(token),
+            headers=self.headers
+        )
+        self._track(response)
+        logger.debug("Login response status: %s", response.status_code)
+
+        # After login, try to access the home page
+        home_response = await self.client.get(f"{self.base_url}/home.do", headers=self.headers)
+        self._track(home_response)
+
+        page_text = home_response.text
+        if any(indicator in page_text for indicator in LOGIN_INDICATORS):
+            if await self.get_student_id():
+                return True
+            logger.warning("Login succeeded but no student ID was returned")
+            return False
+
+        if "Invalid login" in page_text:
+            logger.info("Login failed - invalid credentials")
         else:
-            print(f"Failed to get assignments. Status code: {response.status_code}")
+            logger.info("Login failed - could not find authenticated page elements")
+        return False
+
+    async def _get_json(self, url, params=None, what="data", retry=True):
+        """GET a REST endpoint and decode its JSON body, or return None"""
+        generation = self._session_generation
+        response = await self.client.get(url, params=params, headers=self.headers)
+        self._track(response)
+
+        if self._is_session_expired(response):
+            if retry and await self._renew_session(generation):
+                return await self._get_json(url, params, what, retry=False)
+            logger.warning("Aspen session rejected while fetching %s", what)
             return None
 
+        if response.status_code != 200:
+            logger.warning("Failed to get %s. Status code: %s", what, response.status_code)
+            return None
+
+        try:
+            data = response.json()
+        except json.JSONDecodeError as e:
+            logger.warning("Failed to parse %s JSON response (%d bytes): %s", what, len(response.content), e)
+            return None
+        logger.debug("Got %s (%d bytes)", what, len(response.content))
+        return data
+
+    async def get_student_id(self):
+        """Get the student ID from the users/students API"""
+        if not self.student_id:
+            # No retry here: this runs as part of login() itself
+            students_data = await self._get_json(f"{self.base_url}/rest/users/students", what="student data", retry=False)
+            if students_data:
+                student = students_data[0]  # Get first student
+                self.student_id = student.get('studentOid')
+                self.student_name = student.get('name')
+
+        return self.student_id
+
+    async def get_class_list(self):
+        """Get the list of all classes"""
+        student_id = await self.get_student_id()
+        return await self._get_json(
+            f"{self.base_url}/rest/students/{student_id}/academicClasses",
+            params={'gradeTerm': 'current', 'year': 'current'},
+            what="class list"
+        )
+
+    async def get_grade_details(self, schedule_oid):
+        """Get details for a specific course's assignments"""
+        return await self._get_json(
+            f"{self.base_url}/rest/studentSchedule/{schedule_oid}/assignments",
+            params={'gradeTerm': 'current', 'year': 'current'},
+            what="assignments"
+        )
+
+
 def main():
     scraper = AspenScraper()
     if scraper.login():
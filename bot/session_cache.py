@@ -0,0 +1,80 @@
+import json
+import logging
+import time
+from dataclasses import dataclass, field, asdict
+from typing import Optional, List, Dict
+from bot.cache import TTLCache
+import config
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(slots=True)
+class AspenSession:
+    """An authenticated Aspen session that can be restored into a new client."""
+    username: str
+    student_id: str
+    student_name: Optional[str]
+    cookies: List[Dict[str, str]]
+    created_at: float = field(default_factory=time.time)
+
+    def to_json(self) -> str:
+        return json.dumps(asdict(self))
+
+    @classmethod
+    def from_json(cls, data: str) -> "AspenSession":
+        return cls(**json.loads(data))
+
+
+class SessionCache:
+    """Per-user cache of authenticated Aspen sessions.
+
+    Sessions live in an in-memory TTL/LRU cache keyed by telegram_id. When a
+    store (the Database) is attached, they are also written there encrypted so
+    they survive a restart. A cached session is only trusted for the username
+    it was created with; changing credentials invalidates it.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.store = None
+
+    @property
+    def ttl(self) -> float:
+        return self._cache.ttl
+
+    def attach_store(self, store):
+        """Persist sessions through `store` (an AsyncDatabase instance)."""
+        self.store = store
+
+    async def get(self, telegram_id: int, username: str) -> Optional[AspenSession]:
+        session = self._cache.get(telegram_id)
+
+        if session is None and self.store is not None:
+            stored = await self.store.get_aspen_session(telegram_id)
+            if stored and stored['expires_at'] > time.time():
+                try:
+                    session = AspenSession.from_json(stored['session_data'])
+                    self._cache.set(telegram_id, session, stored_at=session.created_at)
+                except (ValueError, TypeError) as e:
+                    logger.warning(f"Discarding unreadable stored session for user {telegram_id}: {e}")
+                    session = None
+
+        if session is not None and session.username != username:
+            await self.invalidate(telegram_id)
+            return None
+
+        return session
+
+    async def put(self, telegram_id: int, session: AspenSession):
+        self._cache.set(telegram_id, session, stored_at=session.created_at)
+        if self.store is not None:
+            await self.store.save_aspen_session(telegram_id, session.to_json(), session.created_at + self.ttl)
+
+    async def invalidate(self, telegram_id: int):
+        self._cache.pop(telegram_id)
+        if self.store is not None:
+            await self.store.delete_aspen_session(telegram_id)
+
+
+session_cache = SessionCache(maxsize=config.SESSION_CACHE_SIZE, ttl=config.SESSION_CACHE_TTL)
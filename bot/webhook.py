@@ -0,0 +1,74 @@
+import asyncio
+import logging
+from http import HTTPStatus
+from typing import Any, Dict
+from telegram import Update
+from bot.cache import TTLCache
+from bot.log import SampledStats
+import config
+
+logger = logging.getLogger(__name__)
+
+
+class WebhookIntake:
+    """Puts webhook updates on the Application's update_queue and returns at once.
+
+    Telegram redelivers an update when the webhook is slow or fails, so
+    update_ids seen recently are acknowledged and dropped. When `max_queue`
+    updates are already waiting, new ones get a 503 and Telegram retries
+    them later.
+    """
+
+    def __init__(self, max_queue: int, dedup_size: int, dedup_ttl: float):
+        self.max_queue = max_queue
+        self._seen = TTLCache(maxsize=dedup_size, ttl=dedup_ttl)
+        self.received = 0
+        self.enqueued = 0
+        self.duplicates = 0
+        self.rejected = 0
+        self.max_depth = 0
+
+    async def submit(self, update: Update, update_queue: asyncio.Queue) -> HTTPStatus:
+        self.received += 1
+
+        if update.update_id in self._seen:
+            self.duplicates += 1
+            logger.debug(f"Dropping redelivered update {update.update_id}")
+            return HTTPStatus.OK
+
+        depth = update_queue.qsize()
+        if depth >= self.max_queue:
+            self.rejected += 1
+            logger.warning(f"Update queue full ({depth} waiting), asking Telegram to retry update {update.update_id}")
+            return HTTPStatus.SERVICE_UNAVAILABLE
+
+        self._seen.set(update.update_id, True)
+        await update_queue.put(update)
+        self.enqueued += 1
+        self.max_depth = max(self.max_depth, depth + 1)
+        return HTTPStatus.OK
+
+    def stats(self, update_queue: asyncio.Queue) -> Dict[str, Any]:
+        return {
+            'received': self.received,
+            'enqueued': self.enqueued,
+            'duplicates': self.duplicates,
+            'rejected': self.rejected,
+            'depth': update_queue.qsize(),
+            'max_depth': self.max_depth,
+        }
+
+
+webhook_intake = WebhookIntake(
+    max_queue=config.WEBHOOK_QUEUE_MAX,
+    dedup_size=config.WEBHOOK_DEDUP_SIZE,
+    dedup_ttl=config.WEBHOOK_DEDUP_TTL
+)
+
+# Per-update counts and timings for /api/webhook
+webhook_log = SampledStats(
+    "Webhook updates",
+    logger,
+    interval=config.LOG_SUMMARY_INTERVAL,
+    sample_every=config.LOG_SAMPLE_EVERY
+)
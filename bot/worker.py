@@ -0,0 +1,152 @@
+"""Scrape worker processes.
+
+Workers take jobs from the scrape_jobs table, scrape Aspen and send the result
+with their own Bot instance, so daily scraping does not share an event loop
+with the webhook. They must run on the same machine as the bot (they share its
+SQLite database): the web process starts SCRAPE_WORKERS of them itself, or run
+`python -m bot.worker` next to a polling bot.
+"""
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import time
+from datetime import datetime
+from typing import List
+import pytz
+from telegram import Bot
+from bot.log import configure_logging
+from bot.scrape_queue import scrape_scheduler, scrape_budget
+from bot.scheduler import notify_user
+from database import get_async_database
+import config
+
+logger = logging.getLogger(__name__)
+
+WORKER_POLL_INTERVAL = 2.0        # Seconds between polls of an empty queue
+HEARTBEAT_INTERVAL = 60           # Seconds between a worker's heartbeats on the jobs it holds
+STALE_JOB_TIMEOUT = 600           # A running job is given back to the queue after this long without a heartbeat
+FINISHED_JOB_RETENTION = 86400    # Done/failed jobs are deleted after a day
+MAINTENANCE_INTERVAL = 300
+
+
+def _worker_limits(workers: int):
+    """Each worker's share of the Aspen budget left after the bot process's interactive share"""
+    return scrape_budget((1.0 - config.INTERACTIVE_SCRAPE_SHARE) / max(1, workers))
+
+
+async def _run_job(bot: Bot, db, job, worker_id: str):
+    user = await db.get_user(job['telegram_id'])
+    if not user or not user['is_active']:
+        await db.complete_scrape_job(job['id'], worker_id)
+        return
+
+    if job['kind'] != 'notify':
+        await db.fail_scrape_job(job['id'], worker_id, f"unknown job kind {job['kind']!r}")
+        return
+
+    payload = json.loads(job['payload'] or '{}')
+    scheduled_time = datetime.fromtimestamp(payload.get('scheduled_at', time.time()), pytz.UTC)
+    status = await notify_user(bot, user, scheduled_time)
+
+    if status in ('failed', 'error'):
+        # notify_user already told the user; retrying could send the update twice
+        await db.fail_scrape_job(job['id'], worker_id, f"notification {status}")
+    else:
+        await db.complete_scrape_job(job['id'], worker_id)
+
+
+async def _heartbeat(db, worker_id: str):
+    """Keep this worker's running jobs from being re-queued while it is alive"""
+    while True:
+        await asyncio.sleep(HEARTBEAT_INTERVAL)
+        await db.heartbeat_scrape_jobs(worker_id)
+
+
+async def run_worker(worker_id: str, workers: int = 1):
+    """Claim and run scrape jobs until cancelled"""
+    rate_per_minute, burst, max_concurrent = _worker_limits(workers)
+    scrape_scheduler.configure(rate_per_minute, burst, max_concurrent)
+
+    db = get_async_database()
+    slots = asyncio.Semaphore(max_concurrent)
+    last_maintenance = 0.0
+    # A separate task, since the claim loop below blocks while every slot is busy
+    heartbeat = asyncio.create_task(_heartbeat(db, worker_id))
+
+    try:
+        async with Bot(config.TELEGRAM_TOKEN) as bot:
+            logger.info(f"Scrape worker {worker_id} started ({rate_per_minute:g} scrapes/min, {max_concurrent} concurrent)")
+
+            while True:
+                if time.monotonic() - last_maintenance > MAINTENANCE_INTERVAL:
+                    last_maintenance = time.monotonic()
+                    requeued = await db.requeue_stale_scrape_jobs(STALE_JOB_TIMEOUT)
+                    if requeued:
+                        logger.warning(f"Re-queued {requeued} stale scrape jobs")
+                    await db.prune_scrape_jobs(FINISHED_JOB_RETENTION)
+
+                await slots.acquire()
+                job = await db.claim_scrape_job(worker_id)
+                if job is None:
+                    slots.release()
+                    await asyncio.sleep(WORKER_POLL_INTERVAL)
+                    continue
+
+                async def run(job=job):
+                    try:
+                        await _run_job(bot, db, job, worker_id)
+                    except Exception as e:
+                        logger.error(f"Scrape job {job['id']} failed: {str(e)}", exc_info=True)
+                        await db.fail_scrape_job(job['id'], worker_id, str(e), retry=job['attempts'] < 3)
+                    finally:
+                        slots.release()
+
+                asyncio.create_task(run())
+    finally:
+        heartbeat.cancel()
+
+
+def worker_main(index: int, workers: int):
+    """Process entry point"""
+    configure_logging()
+    # The parent process handles Ctrl+C and terminates its workers
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    worker_id = f"{socket.gethostname()}:{os.getpid()}:{index}"
+    try:
+        asyncio.run(run_worker(worker_id, workers))
+    except KeyboardInterrupt:
+        pass
+
+
+def start_workers(count: int) -> List[multiprocessing.Process]:
+    """Start `count` worker processes (spawned, so they get a fresh event loop and DB connection)"""
+    context = multiprocessing.get_context('spawn')
+    processes = []
+    for index in range(count):
+        process = context.Process(target=worker_main, args=(index, count), name=f"scrape-worker-{index}", daemon=True)
+        process.start()
+        processes.append(process)
+    logger.info(f"Started {count} scrape worker processes")
+    return processes
+
+
+def stop_workers(processes: List[multiprocessing.Process], timeout: float = 10.0):
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        process.join(timeout)
+
+
+if __name__ == "__main__":
+    configure_logging()
+    processes = start_workers(max(1, config.SCRAPE_WORKERS))
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        stop_workers(processes)
@@ -28,3 +28,88 @@ ADMIN_USER_IDS = [
     int(chat_id)
     for chat_id in config('ADMIN_USER_IDS', default='', cast=Csv())
 ]
+
+# Aspen HTTP client (shared connection pool for all users)
+ASPEN_HTTP2 = config('ASPEN_HTTP2', default=True, cast=bool)
+ASPEN_TIMEOUT = config('ASPEN_TIMEOUT', default=30.0, cast=float)
+ASPEN_MAX_CONNECTIONS = config('ASPEN_MAX_CONNECTIONS', default=20, cast=int)
+ASPEN_MAX_KEEPALIVE = config('ASPEN_MAX_KEEPALIVE', default=10, cast=int)
+ASPEN_KEEPALIVE_EXPIRY = config('ASPEN_KEEPALIVE_EXPIRY', default=30.0, cast=float)
+# Maximum number of per-class assignment requests in flight for a single user
+ASPEN_CLASS_FETCH_CONCURRENCY = config('ASPEN_CLASS_FETCH_CONCURRENCY', default=4, cast=int)
+
+# Authenticated Aspen sessions are reused for this long before logging in again
+SESSION_CACHE_TTL = config('SESSION_CACHE_TTL', default=1200, cast=int)
+SESSION_CACHE_SIZE = config('SESSION_CACHE_SIZE', default=1000, cast=int)
+
+# Fetched grades are served from memory for this many seconds (/grades refresh bypasses it)
+GRADE_CACHE_TTL = config('GRADE_CACHE_TTL', default=600, cast=int)
+GRADE_CACHE_SIZE = config('GRADE_CACHE_SIZE', default=1000, cast=int)
+# Class rosters (schedule OIDs, course and teacher names) change once a term;
+# they are refreshed whenever grades are fetched and let `/grades <class>` skip the class list
+ROSTER_CACHE_TTL = config('ROSTER_CACHE_TTL', default=7 * 24 * 3600, cast=int)
+
+# Admission control for Aspen scrapes (one scrape = login + class list + assignments)
+ASPEN_SCRAPES_PER_MINUTE = config('ASPEN_SCRAPES_PER_MINUTE', default=6, cast=float)
+ASPEN_SCRAPE_BURST = config('ASPEN_SCRAPE_BURST', default=3, cast=int)
+ASPEN_MAX_CONCURRENT_SCRAPES = config('ASPEN_MAX_CONCURRENT_SCRAPES', default=3, cast=int)
+
+# How many minutes after their chosen time a daily notification may be moved to spread load
+SCHEDULE_TOLERANCE_MINUTES = config('SCHEDULE_TOLERANCE_MINUTES', default=10, cast=int)
+
+# Scrape daily grades up to this many minutes before the notification (0 disables pre-fetching)
+PREFETCH_LEAD_MINUTES = config('PREFETCH_LEAD_MINUTES', default=30, cast=int)
+# Pre-fetched grades older than this (seconds) are refetched live at send time
+PREFETCH_MAX_AGE = config('PREFETCH_MAX_AGE', default=3600, cast=int)
+
+# Daily job scheduling: 'per_user' (one APScheduler job per user) or 'tick' (one
+# per-minute job reading due users from the notification_schedule table)
+SCHEDULER_MODE = config('SCHEDULER_MODE', default='per_user')
+
+# Daily runs missed while the bot was down are sent after a restart, at most this
+# many per minute and only if they were due less than CATCHUP_MAX_AGE_MINUTES ago
+CATCHUP_PER_MINUTE = config('CATCHUP_PER_MINUTE', default=10, cast=int)
+CATCHUP_MAX_AGE_MINUTES = config('CATCHUP_MAX_AGE_MINUTES', default=180, cast=int)
+
+# Scrape worker processes (bot/worker.py). 0 runs daily scrapes in the bot process;
+# otherwise they are queued in SQLite and the bot process starts this many workers.
+# The rate and concurrency limits above are shared: the bot process keeps
+# INTERACTIVE_SCRAPE_SHARE of them for /grades and the workers split the rest.
+SCRAPE_WORKERS = config('SCRAPE_WORKERS', default=0, cast=int)
+INTERACTIVE_SCRAPE_SHARE = config('INTERACTIVE_SCRAPE_SHARE', default=0.25, cast=float)
+
+# Webhook intake: updates are queued and acknowledged immediately. Above
+# WEBHOOK_QUEUE_MAX waiting updates Telegram gets a 503 and retries later;
+# update_ids seen in the last WEBHOOK_DEDUP_TTL seconds are dropped as redeliveries.
+WEBHOOK_QUEUE_MAX = config('WEBHOOK_QUEUE_MAX', default=100, cast=int)
+WEBHOOK_DEDUP_SIZE = config('WEBHOOK_DEDUP_SIZE', default=10000, cast=int)
+WEBHOOK_DEDUP_TTL = config('WEBHOOK_DEDUP_TTL', default=3600, cast=int)
+
+# Logging: root level plus per-logger overrides, e.g. "httpx=WARNING,bot.scheduler=DEBUG"
+LOG_LEVEL = config('LOG_LEVEL', default='INFO').upper()
+LOG_LEVELS = {
+    name.strip(): level.strip().upper()
+    for name, level in (
+        item.split('=', 1)
+        for item in config('LOG_LEVELS', default='httpx=WARNING,apscheduler=WARNING', cast=Csv())
+        if '=' in item
+    )
+}
+# Hot paths (webhook updates) log a summary every LOG_SUMMARY_INTERVAL seconds
+# and one DEBUG sample per LOG_SAMPLE_EVERY events instead of every payload
+LOG_SUMMARY_INTERVAL = config('LOG_SUMMARY_INTERVAL', default=60, cast=int)
+LOG_SAMPLE_EVERY = config('LOG_SAMPLE_EVERY', default=100, cast=int)
+
+# Grade history: each user's snapshots are stored compressed in grade_snapshots
+# (the last GRADE_HISTORY_LIMIT distinct ones) and daily updates are diffed
+# against the last one sent. DAILY_UPDATE_MODE:
+#   'full'    - always send the full report (the old behaviour)
+#   'changes' - "What changed" summary plus the full report; nothing if unchanged
+#   'digest'  - only the "What changed" summary; nothing if unchanged
+GRADE_HISTORY_LIMIT = config('GRADE_HISTORY_LIMIT', default=30, cast=int)
+DAILY_UPDATE_MODE = config('DAILY_UPDATE_MODE', default='changes')
+
+# Daily and pre-fetch scrapes only fetch assignments for classes whose class-list
+# fingerprint (averages, counts) moved since the stored snapshot; /grades always
+# fetches everything
+INCREMENTAL_FETCH = config('INCREMENTAL_FETCH', default=True, cast=bool)
@@ -1,18 +1,209 @@
 import sqlite3
 import os
+import asyncio
+import functools
+import inspect
 import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime
-from typing import Optional, List, Dict, Any
+from collections.abc import Mapping
+from typing import Optional, List, Dict, Any, Iterator, Callable
 from cryptography.fernet import Fernet
 import base64
 
 logger = logging.getLogger(__name__)
 
+# Connection tuning (see _connect)
+SQLITE_CACHE_SIZE_KB = 16 * 1024      # Page cache per connection
+SQLITE_MMAP_SIZE = 64 * 1024 * 1024   # Memory-mapped I/O for reads
+SQLITE_BUSY_TIMEOUT_MS = 5000
+SQLITE_STATEMENT_CACHE = 128          # Prepared statements kept by sqlite3
+
+# Column order expected by Database._user_record
+USER_COLUMNS = 'telegram_id, aspen_username, aspen_password, notification_method, is_active, created_at, last_updated'
+
+
+class UserRecord(Mapping):
+    """Read-only user row whose Aspen credentials are decrypted on first access.
+
+    Behaves like the dicts the Database used to return, so admin and broadcast
+    paths that never read the credentials never pay for decryption.
+    """
+
+    __slots__ = ('_data', '_encrypted', '_decrypt')
+
+    def __init__(self, data: Dict[str, Any], encrypted: Dict[str, str], decrypt: Callable[[str], str]):
+        self._data = data
+        self._encrypted = encrypted
+        self._decrypt = decrypt
+
+    def __getitem__(self, key):
+        if key in self._encrypted:
+            self._data[key] = self._decrypt(self._encrypted.pop(key))
+        return self._data[key]
+
+    def __contains__(self, key):
+        return key in self._data or key in self._encrypted
+
+    def __iter__(self):
+        yield from self._data
+        yield from list(self._encrypted)
+
+    def __len__(self):
+        return len(self._data) + len(self._encrypted)
+
+    def __repr__(self):
+        return f"UserRecord(telegram_id={self._data.get('telegram_id')!r})"
+
+# Schema migrations as (version, description, statements), applied in order.
+# Never edit a released migration; append a new one instead.
+MIGRATIONS = [
+    (1, "initial schema", [
+        '''
+        CREATE TABLE IF NOT EXISTS users (
+            telegram_id INTEGER PRIMARY KEY,
+            aspen_username TEXT,
+            aspen_password TEXT,
+            notification_method TEXT DEFAULT 'telegram',
+            email TEXT,
+            is_active BOOLEAN DEFAULT 1,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        # User settings table for additional preferences
+        '''
+        CREATE TABLE IF NOT EXISTS user_settings (
+            telegram_id INTEGER PRIMARY KEY,
+            timezone TEXT DEFAULT 'America/Chicago',
+            notification_frequency TEXT DEFAULT 'daily',
+            notification_time TEXT DEFAULT '15:00',
+            FOREIGN KEY (telegram_id) REFERENCES users (telegram_id)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS feedback (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            username TEXT,
+            first_name TEXT,
+            feedback_type TEXT,
+            message TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+    ]),
+    # Databases created before notification_time existed
+    (2, "add user_settings.notification_time", [
+        'ALTER TABLE user_settings ADD COLUMN notification_time TEXT DEFAULT "15:00"',
+    ]),
+    (3, "fix invalid users.created_at timestamps", [
+        '''
+        UPDATE users
+        SET created_at = datetime('now')
+        WHERE created_at IS NULL OR created_at = '' OR created_at = '1' OR created_at = 1
+        ''',
+    ]),
+    # Encrypted Aspen sessions (cookies + student info) reused across logins
+    (4, "add aspen_sessions", [
+        '''
+        CREATE TABLE IF NOT EXISTS aspen_sessions (
+            telegram_id INTEGER PRIMARY KEY,
+            session_data TEXT,
+            expires_at REAL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+    ]),
+    # Time-indexed schedule read by the per-minute tick (SCHEDULER_MODE=tick)
+    (5, "add notification_schedule", [
+        '''
+        CREATE TABLE IF NOT EXISTS notification_schedule (
+            telegram_id INTEGER PRIMARY KEY,
+            utc_minute INTEGER NOT NULL,
+            prefetch_minute INTEGER,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_notification_schedule_utc_minute ON notification_schedule (utc_minute)',
+        'CREATE INDEX IF NOT EXISTS idx_notification_schedule_prefetch_minute ON notification_schedule (prefetch_minute)',
+    ]),
+    # Persisted run state, so restarts reuse unchanged schedules and catch up missed runs
+    (6, "add notification_schedule run state", [
+        'ALTER TABLE notification_schedule ADD COLUMN next_run_at REAL',
+        'ALTER TABLE notification_schedule ADD COLUMN last_run_at REAL',
+        'ALTER TABLE notification_schedule ADD COLUMN last_run_status TEXT',
+        'ALTER TABLE notification_schedule ADD COLUMN settings_hash TEXT',
+    ]),
+    # Durable queue between the bot process and the scrape workers (bot/worker.py)
+    (7, "add scrape_jobs", [
+        '''
+        CREATE TABLE IF NOT EXISTS scrape_jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            telegram_id INTEGER NOT NULL,
+            kind TEXT NOT NULL,
+            payload TEXT,
+            priority INTEGER DEFAULT 1,
+            status TEXT DEFAULT 'queued',
+            attempts INTEGER DEFAULT 0,
+            claimed_by TEXT,
+            claimed_at REAL,
+            finished_at REAL,
+            error TEXT,
+            created_at REAL
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_scrape_jobs_queue ON scrape_jobs (status, priority, id)',
+    ]),
+    (8, "add grade_snapshots", [
+        '''
+        CREATE TABLE IF NOT EXISTS grade_snapshots (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            telegram_id INTEGER NOT NULL,
+            version INTEGER NOT NULL,
+            content_hash TEXT NOT NULL,
+            data BLOB NOT NULL,
+            fetched_at REAL NOT NULL,
+            notified INTEGER DEFAULT 0
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_grade_snapshots_user ON grade_snapshots (telegram_id, id)',
+    ]),
+    # Workers refresh heartbeat_at while they hold a job, so only jobs of dead workers are re-queued
+    (9, "add scrape_jobs.heartbeat_at", [
+        'ALTER TABLE scrape_jobs ADD COLUMN heartbeat_at REAL',
+    ]),
+]
+
+# Columns of notification_schedule that get_scheduled_users can look up by
+SCHEDULE_MINUTE_COLUMNS = frozenset({'utc_minute', 'prefetch_minute'})
+
+# Active users joined with their settings; Database._user_with_settings builds the records
+USER_WITH_SETTINGS_SELECT = '''
+    SELECT u.telegram_id, u.aspen_username, u.aspen_password, u.notification_method,
+           u.is_active, u.created_at, u.last_updated,
+           COALESCE(s.timezone, 'America/Chicago'),
+           COALESCE(s.notification_frequency, 'daily'),
+           COALESCE(s.notification_time, '15:00'),
+           s.telegram_id IS NOT NULL
+    FROM users u
+    LEFT JOIN user_settings s ON s.telegram_id = u.telegram_id
+'''
+
 class Database:
     def __init__(self, db_path=None):
         """
         Initialize database connection.
         Uses Railway volume path for persistence in production, local path for development.
+
+        A single long-lived connection in WAL mode is shared by all methods;
+        calls are serialized with a lock so the instance can be used from
+        several threads. The connection is opened (and the schema migrated)
+        lazily on the first query. Use get_database() rather than creating
+        instances directly.
         """
         # Use local path for development, Railway volume path for production
         if db_path is None:
@@ -27,8 +218,106 @@ class Database:
         os.makedirs(os.path.dirname(db_path), exist_ok=True)
 
         self.db_path = db_path
-        self.encryption_key = self._get_or_create_encryption_key()
-        self.init_database()
+        self._lock = threading.RLock()
+        self._in_batch = False
+        # Both are loaded on first use so that constructing a Database is free
+        self._connection = None
+        self._encryption_key = None
+        self._fernet = None
+
+    @property
+    def encryption_key(self) -> bytes:
+        if self._encryption_key is None:
+            self._encryption_key = self._get_or_create_encryption_key()
+        return self._encryption_key
+
+    @property
+    def _conn(self) -> sqlite3.Connection:
+        """The shared connection, opened and migrated on first access."""
+        if self._connection is None:
+            with self._lock:
+                if self._connection is None:
+                    conn = self._connect()
+                    self._migrate(conn)
+                    self._connection = conn
+                    logger.info("Database initialized successfully")
+        return self._connection
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open the shared connection with WAL journaling and tuned pragmas."""
+        conn = sqlite3.connect(
+            self.db_path,
+            check_same_thread=False,
+            cached_statements=SQLITE_STATEMENT_CACHE
+        )
+        conn.execute('PRAGMA journal_mode=WAL')
+        # NORMAL is durable across application crashes in WAL mode and avoids an fsync per commit
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute(f'PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}')
+        conn.execute(f'PRAGMA mmap_size={SQLITE_MMAP_SIZE}')
+        conn.execute('PRAGMA temp_store=MEMORY')
+        conn.execute(f'PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}')
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        """Yield a cursor on the shared connection; commit on success, roll back on error."""
+        with self._lock:
+            if self._in_batch:
+                # The enclosing batch() commits once for all of its statements; a
+                # savepoint undoes just this call's statements if it fails (issued
+                # on the connection so the cursor's rowcount stays the method's)
+                self._conn.execute('SAVEPOINT write_call')
+                cursor = self._conn.cursor()
+                try:
+                    yield cursor
+                    self._conn.execute('RELEASE SAVEPOINT write_call')
+                except Exception:
+                    self._conn.execute('ROLLBACK TO SAVEPOINT write_call')
+                    self._conn.execute('RELEASE SAVEPOINT write_call')
+                    raise
+                finally:
+                    cursor.close()
+                return
+
+            cursor = self._conn.cursor()
+            try:
+                yield cursor
+                self._conn.commit()
+            except Exception:
+                self._conn.rollback()
+                raise
+            finally:
+                cursor.close()
+
+    @contextmanager
+    def batch(self):
+        """Run several Database method calls in one transaction with a single commit."""
+        with self._lock:
+            if self._in_batch:
+                yield
+                return
+
+            self._in_batch = True
+            try:
+                # Open the transaction here: a SAVEPOINT issued in autocommit mode
+                # would start (and its RELEASE commit) a transaction of its own
+                if not self._conn.in_transaction:
+                    self._conn.execute('BEGIN')
+                yield
+                self._conn.commit()
+            except Exception:
+                self._conn.rollback()
+                raise
+            finally:
+                self._in_batch = False
+
+    def close(self):
+        """Close the shared connection."""
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
 
     def _get_or_create_encryption_key(self) -> bytes:
         """Get or create encryption key for credential security."""
@@ -45,117 +334,112 @@ class Database:
                 f.write(key)
             return key
 
+    @property
+    def _cipher(self) -> Fernet:
+        """Fernet instance for encryption_key, built once."""
+        if self._fernet is None:
+            self._fernet = Fernet(self.encryption_key)
+        return self._fernet
+
     def _encrypt(self, data: str) -> str:
         """Encrypt sensitive data."""
-        f = Fernet(self.encryption_key)
-        return f.encrypt(data.encode()).decode()
+        return self._cipher.encrypt(data.encode()).decode()
 
     def _decrypt(self, encrypted_data: str) -> str:
         """Decrypt sensitive data."""
-        f = Fernet(self.encryption_key)
-        return f.decrypt(encrypted_data.encode()).decode()
+        return self._cipher.decrypt(encrypted_data.encode()).decode()
+
+    def _user_record(self, row, **extra) -> "UserRecord":
+        """Build a UserRecord from a row selected with USER_COLUMNS."""
+        return UserRecord(
+            {
+                'telegram_id': row[0],
+                'notification_method': row[3],
+                'is_active': bool(row[4]),
+                'created_at': row[5],
+                'last_updated': row[6],
+                **extra
+            },
+            {'aspen_username': row[1], 'aspen_password': row[2]},
+            self._decrypt
+        )
+
+    def _user_with_settings(self, row) -> "UserRecord":
+        """Build a UserRecord from a row selected with USER_WITH_SETTINGS_SELECT."""
+        return self._user_record(
+            row,
+            timezone=row[7],
+            notification_frequency=row[8],
+            notification_time=row[9],
+            has_settings=bool(row[10])
+        )
 
     def init_database(self):
-        """Initialize database tables."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-
-        # Users table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS users (
-                telegram_id INTEGER PRIMARY KEY,
-                aspen_username TEXT,
-                aspen_password TEXT,
-                notification_method TEXT DEFAULT 'telegram',
-                email TEXT,
-                is_active BOOLEAN DEFAULT 1,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
+        """Create or upgrade the schema. Runs automatically on first use."""
+        self._conn
 
-        # User settings table for additional preferences
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS user_settings (
-                telegram_id INTEGER PRIMARY KEY,
-                timezone TEXT DEFAULT 'America/Chicago',
-                notification_frequency TEXT DEFAULT 'daily',
-                notification_time TEXT DEFAULT '15:00',
-                FOREIGN KEY (telegram_id) REFERENCES users (telegram_id)
-            )
-        ''')
-
-        # Add notification_time column if it doesn't exist (for existing databases)
-        try:
-            cursor.execute('ALTER TABLE user_settings ADD COLUMN notification_time TEXT DEFAULT "15:00"')
-            logger.info("Added notification_time column to existing user_settings table")
-        except sqlite3.OperationalError as e:
-            if "duplicate column name" in str(e):
-                logger.info("notification_time column already exists")
-            else:
-                logger.warning(f"Could not add notification_time column: {e}")
-
-        # Fix existing users with invalid timestamps
+    def _migrate(self, conn: sqlite3.Connection):
+        """Apply the MIGRATIONS newer than the version recorded in schema_version."""
+        # IMMEDIATE takes the write lock up front so concurrent processes migrate one at a time
+        conn.execute('BEGIN IMMEDIATE')
         try:
-            # Fix various invalid timestamp formats
-            cursor.execute('''
-                UPDATE users
-                SET created_at = datetime('now')
-                WHERE created_at IS NULL OR created_at = '' OR created_at = '1' OR created_at = 1
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS schema_version (
+                    version INTEGER PRIMARY KEY,
+                    description TEXT,
+                    applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
             ''')
-            logger.info("Fixed invalid timestamps in existing users")
-        except Exception as e:
-            logger.warning(f"Could not fix timestamps: {e}")
-
-        # Create feedback table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS feedback (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER,
-                username TEXT,
-                first_name TEXT,
-                feedback_type TEXT,
-                message TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-
-        conn.commit()
-        conn.close()
-        logger.info("Database initialized successfully")
+            current_version = conn.execute('SELECT COALESCE(MAX(version), 0) FROM schema_version').fetchone()[0]
+
+            for version, description, statements in MIGRATIONS:
+                if version <= current_version:
+                    continue
+
+                for statement in statements:
+                    try:
+                        conn.execute(statement)
+                    except sqlite3.OperationalError as e:
+                        # Databases created before schema_version existed may already have the column
+                        if "duplicate column name" not in str(e):
+                            raise
+
+                conn.execute('INSERT INTO schema_version (version, description) VALUES (?, ?)', (version, description))
+                logger.info(f"Applied database migration {version}: {description}")
+
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
 
     def add_user(self, telegram_id: int, aspen_username: str, aspen_password: str,
                  notification_method: str = 'telegram') -> bool:
         """Add or update user credentials."""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
+            with self._transaction() as cursor:
+                # Encrypt credentials
+                encrypted_username = self._encrypt(aspen_username)
+                encrypted_password = self._encrypt(aspen_password)
+
+                # Check if user exists
+                cursor.execute('SELECT telegram_id FROM users WHERE telegram_id = ?', (telegram_id,))
+                existing_user = cursor.fetchone()
+
+                if existing_user:
+                    # Update existing user
+                    cursor.execute('''
+                        UPDATE users
+                        SET aspen_username = ?, aspen_password = ?, notification_method = ?, last_updated = ?
+                        WHERE telegram_id = ?
+                    ''', (encrypted_username, encrypted_password, notification_method, datetime.utcnow(), telegram_id))
+                else:
+                    # Insert new user
+                    cursor.execute('''
+                        INSERT INTO users
+                        (telegram_id, aspen_username, aspen_password, notification_method, created_at, last_updated)
+                        VALUES (?, ?, ?, ?, ?, ?)
+                    ''', (telegram_id, encrypted_username, encrypted_password, notification_method, datetime.utcnow(), datetime.utcnow()))
 
-            # Encrypt credentials
-            encrypted_username = self._encrypt(aspen_username)
-            encrypted_password = self._encrypt(aspen_password)
-
-            # Check if user exists
-            cursor.execute('SELECT telegram_id FROM users WHERE telegram_id = ?', (telegram_id,))
-            existing_user = cursor.fetchone()
-
-            if existing_user:
-                # Update existing user
-                cursor.execute('''
-                    UPDATE users
-                    SET aspen_username = ?, aspen_password = ?, notification_method = ?, last_updated = ?
-                    WHERE telegram_id = ?
-                ''', (encrypted_username, encrypted_password, notification_method, datetime.utcnow(), telegram_id))
-            else:
-                # Insert new user
-                cursor.execute('''
-                    INSERT INTO users
-                    (telegram_id, aspen_username, aspen_password, notification_method, created_at, last_updated)
-                    VALUES (?, ?, ?, ?, ?, ?)
-                ''', (telegram_id, encrypted_username, encrypted_password, notification_method, datetime.utcnow(), datetime.utcnow()))
-
-            conn.commit()
-            conn.close()
             logger.info(f"User {telegram_id} added/updated successfully")
             return True
 
@@ -163,73 +447,72 @@ class Database:
             logger.error(f"Error adding user {telegram_id}: {e}")
             return False
 
-    def get_user(self, telegram_id: int) -> Optional[Dict[str, Any]]:
+    def get_user(self, telegram_id: int) -> Optional["UserRecord"]:
         """Get user data by telegram ID."""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-
-            cursor.execute('SELECT * FROM users WHERE telegram_id = ?', (telegram_id,))
-            user = cursor.fetchone()
-            conn.close()
+            with self._transaction() as cursor:
+                cursor.execute(f'SELECT {USER_COLUMNS} FROM users WHERE telegram_id = ?', (telegram_id,))
+                user = cursor.fetchone()
 
             if user:
-                return {
-                    'telegram_id': user[0],
-                    'aspen_username': self._decrypt(user[1]),
-                    'aspen_password': self._decrypt(user[2]),
-                    'notification_method': user[3],
-                    'is_active': bool(user[5]),  # Fixed: was user[4], should be user[5]
-                    'created_at': user[6],        # Fixed: was user[5], should be user[6]
-                    'last_updated': user[7]       # Fixed: was user[6], should be user[7]
-                }
+                return self._user_record(user)
             return None
 
         except Exception as e:
             logger.error(f"Error getting user {telegram_id}: {e}")
             return None
 
-    def get_all_active_users(self) -> List[Dict[str, Any]]:
-        """Get all active users."""
+    def get_all_active_users(self) -> List["UserRecord"]:
+        """Get all active users. Credentials are only decrypted when accessed."""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-
-            cursor.execute('SELECT * FROM users WHERE is_active = 1')
-            users = cursor.fetchall()
-            conn.close()
+            with self._transaction() as cursor:
+                cursor.execute(f'SELECT {USER_COLUMNS} FROM users WHERE is_active = 1')
+                users = cursor.fetchall()
 
-            result = []
-            for user in users:
-                result.append({
-                    'telegram_id': user[0],
-                    'aspen_username': self._decrypt(user[1]),
-                    'aspen_password': self._decrypt(user[2]),
-                    'notification_method': user[3],
-                    'is_active': bool(user[4]),
-                    'created_at': user[5],
-                    'last_updated': user[6]
-                })
-
-            return result
+            return [self._user_record(user) for user in users]
 
         except Exception as e:
             logger.error(f"Error getting all users: {e}")
             return []
 
+    def get_active_users_with_settings(self, batch_size: int = 500) -> Iterator["UserRecord"]:
+        """Yield every active user joined with their settings, in a single query.
+
+        Users without a user_settings row get the defaults and has_settings=False.
+        Rows are fetched in batches so large user tables are streamed.
+        """
+        try:
+            with self._lock:
+                cursor = self._conn.cursor()
+                cursor.execute(USER_WITH_SETTINGS_SELECT + '''
+                    WHERE u.is_active = 1
+                    ORDER BY u.telegram_id
+                ''')
+
+            try:
+                while True:
+                    with self._lock:
+                        rows = cursor.fetchmany(batch_size)
+                    if not rows:
+                        break
+
+                    for row in rows:
+                        yield self._user_with_settings(row)
+            finally:
+                cursor.close()
+
+        except Exception as e:
+            logger.error(f"Error getting active users with settings: {e}")
+
     def add_feedback(self, user_id: int, username: str, first_name: str, feedback_type: str, message: str) -> bool:
         """Add feedback to database."""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-
-            cursor.execute('''
-                INSERT INTO feedback (user_id, username, first_name, feedback_type, message)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (user_id, username, first_name, feedback_type, message))
+            with self._transaction() as cursor:
+                cursor.execute('''
+                    INSERT INTO feedback (user_id, username, first_name, feedback_type, message)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', (user_id, username, first_name, feedback_type, message))
 
-            conn.commit()
-            conn.close()
             logger.info(f"Feedback added from user {user_id}")
             return True
 
@@ -240,18 +523,15 @@ class Database:
     def get_feedback(self, limit: int = 10) -> List[Dict[str, Any]]:
         """Get recent feedback messages."""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-
-            cursor.execute('''
-                SELECT user_id, username, first_name, feedback_type, message, created_at
-                FROM feedback
-                ORDER BY created_at DESC
-                LIMIT ?
-            ''', (limit,))
+            with self._transaction() as cursor:
+                cursor.execute('''
+                    SELECT user_id, username, first_name, feedback_type, message, created_at
+                    FROM feedback
+                    ORDER BY created_at DESC
+                    LIMIT ?
+                ''', (limit,))
 
-            feedback_list = cursor.fetchall()
-            conn.close()
+                feedback_list = cursor.fetchall()
 
             result = []
             for feedback in feedback_list:
@@ -273,17 +553,13 @@ class Database:
     def update_user_notification_method(self, telegram_id: int, method: str) -> bool:
         """Update user's notification method."""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-
-            cursor.execute('''
-                UPDATE users
-                SET notification_method = ?, last_updated = ?
-                WHERE telegram_id = ?
-            ''', (method, datetime.utcnow(), telegram_id))
+            with self._transaction() as cursor:
+                cursor.execute('''
+                    UPDATE users
+                    SET notification_method = ?, last_updated = ?
+                    WHERE telegram_id = ?
+                ''', (method, datetime.utcnow(), telegram_id))
 
-            conn.commit()
-            conn.close()
             return cursor.rowcount > 0
 
         except Exception as e:
@@ -295,12 +571,9 @@ class Database:
     def get_user_settings(self, telegram_id: int) -> Optional[Dict[str, Any]]:
         """Get user settings."""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-
-            cursor.execute('SELECT * FROM user_settings WHERE telegram_id = ?', (telegram_id,))
-            settings = cursor.fetchone()
-            conn.close()
+            with self._transaction() as cursor:
+                cursor.execute('SELECT * FROM user_settings WHERE telegram_id = ?', (telegram_id,))
+                settings = cursor.fetchone()
 
             if settings:
                 return {
@@ -318,22 +591,17 @@ class Database:
     def update_user_notification_time(self, telegram_id: int, notification_time: str) -> bool:
         """Update user's notification time."""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-
-            # Get current timezone or use default
-            current_settings = self.get_user_settings(telegram_id)
-            timezone = current_settings.get('timezone', 'America/Chicago') if current_settings else 'America/Chicago'
-
-            # Insert or update user settings
-            cursor.execute('''
-                INSERT OR REPLACE INTO user_settings
-                (telegram_id, timezone, notification_frequency, notification_time)
-                VALUES (?, ?, ?, ?)
-            ''', (telegram_id, timezone, 'daily', notification_time))
+            with self._transaction() as cursor:
+                # Insert or update user settings, keeping the current timezone
+                cursor.execute('''
+                    INSERT INTO user_settings
+                    (telegram_id, timezone, notification_frequency, notification_time)
+                    VALUES (?, 'America/Chicago', 'daily', ?)
+                    ON CONFLICT(telegram_id) DO UPDATE SET
+                        notification_frequency = 'daily',
+                        notification_time = excluded.notification_time
+                ''', (telegram_id, notification_time))
 
-            conn.commit()
-            conn.close()
             return True
 
         except Exception as e:
@@ -343,22 +611,17 @@ class Database:
     def update_user_timezone(self, telegram_id: int, timezone: str) -> bool:
         """Update user's timezone."""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-
-            # Get current settings or use defaults
-            current_settings = self.get_user_settings(telegram_id)
-            notification_time = current_settings.get('notification_time', '15:00') if current_settings else '15:00'
-
-            # Insert or update user settings
-            cursor.execute('''
-                INSERT OR REPLACE INTO user_settings
-                (telegram_id, timezone, notification_frequency, notification_time)
-                VALUES (?, ?, ?, ?)
-            ''', (telegram_id, timezone, 'daily', notification_time))
+            with self._transaction() as cursor:
+                # Insert or update user settings, keeping the current notification time
+                cursor.execute('''
+                    INSERT INTO user_settings
+                    (telegram_id, timezone, notification_frequency, notification_time)
+                    VALUES (?, ?, 'daily', '15:00')
+                    ON CONFLICT(telegram_id) DO UPDATE SET
+                        notification_frequency = 'daily',
+                        timezone = excluded.timezone
+                ''', (telegram_id, timezone))
 
-            conn.commit()
-            conn.close()
             return True
 
         except Exception as e:
@@ -368,17 +631,13 @@ class Database:
     def deactivate_user(self, telegram_id: int) -> bool:
         """Deactivate user account."""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-
-            cursor.execute('''
-                UPDATE users
-                SET is_active = 0, last_updated = ?
-                WHERE telegram_id = ?
-            ''', (datetime.utcnow(), telegram_id))
+            with self._transaction() as cursor:
+                cursor.execute('''
+                    UPDATE users
+                    SET is_active = 0, last_updated = ?
+                    WHERE telegram_id = ?
+                ''', (datetime.utcnow(), telegram_id))
 
-            conn.commit()
-            conn.close()
             return cursor.rowcount > 0
 
         except Exception as e:
@@ -388,31 +647,429 @@ class Database:
     def delete_user(self, telegram_id: int) -> bool:
         """Delete user account completely."""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
+            with self._transaction() as cursor:
+                cursor.execute('DELETE FROM users WHERE telegram_id = ?', (telegram_id,))
+                affected_users = cursor.rowcount
+                cursor.execute('DELETE FROM user_settings WHERE telegram_id = ?', (telegram_id,))
+                affected_settings = cursor.rowcount
+                cursor.execute('DELETE FROM aspen_sessions WHERE telegram_id = ?', (telegram_id,))
+                cursor.execute('DELETE FROM notification_schedule WHERE telegram_id = ?', (telegram_id,))
+                cursor.execute('DELETE FROM grade_snapshots WHERE telegram_id = ?', (telegram_id,))
 
-            cursor.execute('DELETE FROM users WHERE telegram_id = ?', (telegram_id,))
-            affected_users = cursor.rowcount
-            cursor.execute('DELETE FROM user_settings WHERE telegram_id = ?', (telegram_id,))
-            affected_settings = cursor.rowcount
-
-            conn.commit()
-            conn.close()
             return (affected_users + affected_settings) > 0
 
         except Exception as e:
             logger.error(f"Error deleting user {telegram_id}: {e}")
             return False
 
+    def save_aspen_session(self, telegram_id: int, session_data: str, expires_at: float) -> bool:
+        """Store an authenticated Aspen session, encrypted, for reuse after restarts."""
+        try:
+            with self._transaction() as cursor:
+                cursor.execute('''
+                    INSERT OR REPLACE INTO aspen_sessions (telegram_id, session_data, expires_at, updated_at)
+                    VALUES (?, ?, ?, ?)
+                ''', (telegram_id, self._encrypt(session_data), expires_at, datetime.utcnow()))
+
+            return True
+
+        except Exception as e:
+            logger.error(f"Error saving Aspen session for {telegram_id}: {e}")
+            return False
+
+    def get_aspen_session(self, telegram_id: int) -> Optional[Dict[str, Any]]:
+        """Get a stored Aspen session (decrypted) and its expiry timestamp."""
+        try:
+            with self._transaction() as cursor:
+                cursor.execute('SELECT session_data, expires_at FROM aspen_sessions WHERE telegram_id = ?', (telegram_id,))
+                row = cursor.fetchone()
+
+            if row:
+                return {
+                    'session_data': self._decrypt(row[0]),
+                    'expires_at': row[1]
+                }
+            return None
+
+        except Exception as e:
+            logger.error(f"Error getting Aspen session for {telegram_id}: {e}")
+            return None
+
+    def delete_aspen_session(self, telegram_id: int) -> bool:
+        """Forget a stored Aspen session."""
+        try:
+            with self._transaction() as cursor:
+                cursor.execute('DELETE FROM aspen_sessions WHERE telegram_id = ?', (telegram_id,))
+
+            return cursor.rowcount > 0
+
+        except Exception as e:
+            logger.error(f"Error deleting Aspen session for {telegram_id}: {e}")
+            return False
+
+    def save_notification_schedule(self, telegram_id: int, utc_minute: int, prefetch_minute: Optional[int],
+                                   next_run_at: float, settings_hash: str) -> bool:
+        """Store when a user is next notified (and pre-fetched), as UTC minutes of day and a timestamp."""
+        try:
+            with self._transaction() as cursor:
+                cursor.execute('''
+                    INSERT INTO notification_schedule
+                    (telegram_id, utc_minute, prefetch_minute, next_run_at, settings_hash, updated_at)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(telegram_id) DO UPDATE SET
+                        utc_minute = excluded.utc_minute,
+                        prefetch_minute = excluded.prefetch_minute,
+                        next_run_at = excluded.next_run_at,
+                        settings_hash = excluded.settings_hash,
+                        updated_at = excluded.updated_at
+                ''', (telegram_id, utc_minute, prefetch_minute, next_run_at, settings_hash, datetime.utcnow()))
+
+            return True
+
+        except Exception as e:
+            logger.error(f"Error saving notification schedule for {telegram_id}: {e}")
+            return False
+
+    def sync_notification_schedule(self, entries: List[tuple]) -> bool:
+        """Replace the whole schedule in one transaction.
+
+        `entries` are `(telegram_id, utc_minute, prefetch_minute, next_run_at, settings_hash)`.
+        Rows that did not change are left alone; rows for users missing from
+        `entries` are removed. Run state (last_run_*) is kept.
+        """
+        try:
+            now = datetime.utcnow()
+            with self._transaction() as cursor:
+                cursor.execute('CREATE TEMP TABLE IF NOT EXISTS schedule_sync (telegram_id INTEGER PRIMARY KEY)')
+                cursor.execute('DELETE FROM schedule_sync')
+                cursor.executemany('INSERT INTO schedule_sync (telegram_id) VALUES (?)',
+                                   ((entry[0],) for entry in entries))
+                cursor.execute('''
+                    DELETE FROM notification_schedule
+                    WHERE telegram_id NOT IN (SELECT telegram_id FROM schedule_sync)
+                ''')
+                cursor.executemany('''
+                    INSERT INTO notification_schedule
+                    (telegram_id, utc_minute, prefetch_minute, next_run_at, settings_hash, updated_at)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(telegram_id) DO UPDATE SET
+                        utc_minute = excluded.utc_minute,
+                        prefetch_minute = excluded.prefetch_minute,
+                        next_run_at = excluded.next_run_at,
+                        settings_hash = excluded.settings_hash,
+                        updated_at = excluded.updated_at
+                    WHERE utc_minute != excluded.utc_minute
+                       OR prefetch_minute IS NOT excluded.prefetch_minute
+                       OR next_run_at IS NOT excluded.next_run_at
+                       OR settings_hash IS NOT excluded.settings_hash
+                ''', ((*entry, now) for entry in entries))
+
+            return True
+
+        except Exception as e:
+            logger.error(f"Error syncing notification schedule: {e}")
+            return False
+
+    def get_notification_schedule(self) -> Dict[int, Dict[str, Any]]:
+        """All stored schedule rows keyed by telegram_id."""
+        try:
+            with self._transaction() as cursor:
+                cursor.execute('''
+                    SELECT telegram_id, utc_minute, prefetch_minute, next_run_at,
+                           last_run_at, last_run_status, settings_hash
+                    FROM notification_schedule
+                ''')
+                rows = cursor.fetchall()
+
+            return {
+                row[0]: {
+                    'utc_minute': row[1],
+                    'prefetch_minute': row[2],
+                    'next_run_at': row[3],
+                    'last_run_at': row[4],
+                    'last_run_status': row[5],
+                    'settings_hash': row[6]
+                }
+                for row in rows
+            }
+
+        except Exception as e:
+            logger.error(f"Error getting notification schedule: {e}")
+            return {}
+
+    def record_notification_run(self, telegram_id: int, status: str, next_run_at: float) -> bool:
+        """Record the outcome of a daily run and when the next one is due."""
+        try:
+            with self._transaction() as cursor:
+                cursor.execute('''
+                    UPDATE notification_schedule
+                    SET last_run_at = ?, last_run_status = ?, next_run_at = MAX(COALESCE(next_run_at, 0), ?)
+                    WHERE telegram_id = ?
+                ''', (time.time(), status, next_run_at, telegram_id))
+
+            return cursor.rowcount > 0
+
+        except Exception as e:
+            logger.error(f"Error recording notification run for {telegram_id}: {e}")
+            return False
+
+    def get_last_run_status_counts(self) -> Dict[str, int]:
+        """How many users' last daily run ended in each status."""
+        try:
+            with self._transaction() as cursor:
+                cursor.execute('''
+                    SELECT COALESCE(last_run_status, 'pending'), COUNT(*)
+                    FROM notification_schedule
+                    GROUP BY 1
+                ''')
+                return dict(cursor.fetchall())
+
+        except Exception as e:
+            logger.error(f"Error getting last run statuses: {e}")
+            return {}
+
+    def get_scheduled_users(self, minute: int, column: str = 'utc_minute') -> List["UserRecord"]:
+        """Active users (with settings) whose schedule `column` equals `minute` (UTC minute of day)."""
+        if column not in SCHEDULE_MINUTE_COLUMNS:
+            raise ValueError(f"Unknown schedule column: {column}")
+
+        try:
+            with self._transaction() as cursor:
+                cursor.execute(USER_WITH_SETTINGS_SELECT + f'''
+                    JOIN notification_schedule n ON n.telegram_id = u.telegram_id
+                    WHERE n.{column} = ? AND u.is_active = 1
+                ''', (minute,))
+                rows = cursor.fetchall()
+
+            return [self._user_with_settings(row) for row in rows]
+
+        except Exception as e:
+            logger.error(f"Error getting users scheduled at minute {minute}: {e}")
+            return []
+
+    def enqueue_scrape_job(self, telegram_id: int, kind: str, payload: str, priority: int = 1) -> Optional[int]:
+        """Queue a job for the scrape workers; returns its id, or None if the user already has one queued."""
+        try:
+            with self._transaction() as cursor:
+                cursor.execute('''
+                    INSERT INTO scrape_jobs (telegram_id, kind, payload, priority, created_at)
+                    SELECT ?, ?, ?, ?, ?
+                    WHERE NOT EXISTS (
+                        SELECT 1 FROM scrape_jobs WHERE telegram_id = ? AND kind = ? AND status = 'queued'
+                    )
+                ''', (telegram_id, kind, payload, priority, time.time(), telegram_id, kind))
+
+            return cursor.lastrowid if cursor.rowcount else None
+
+        except Exception as e:
+            logger.error(f"Error queueing {kind} job for {telegram_id}: {e}")
+            return None
+
+    def claim_scrape_job(self, worker_id: str) -> Optional[Dict[str, Any]]:
+        """Atomically take the most urgent queued job for `worker_id`."""
+        now = time.time()
+        try:
+            with self._transaction() as cursor:
+                # A single UPDATE takes SQLite's write lock, so two workers never claim the same job
+                cursor.execute('''
+                    UPDATE scrape_jobs
+                    SET status = 'running', claimed_by = ?, claimed_at = ?, heartbeat_at = ?,
+                        attempts = attempts + 1
+                    WHERE id = (
+                        SELECT id FROM scrape_jobs
+                        WHERE status = 'queued'
+                        ORDER BY priority, id
+                        LIMIT 1
+                    )
+                    RETURNING id, telegram_id, kind, payload, priority, attempts
+                ''', (worker_id, now, now))
+                row = cursor.fetchone()
+
+            if row:
+                return {
+                    'id': row[0],
+                    'telegram_id': row[1],
+                    'kind': row[2],
+                    'payload': row[3],
+                    'priority': row[4],
+                    'attempts': row[5]
+                }
+            return None
+
+        except Exception as e:
+            logger.error(f"Error claiming scrape job for {worker_id}: {e}")
+            return None
+
+    def complete_scrape_job(self, job_id: int, worker_id: str) -> bool:
+        """Mark a job done; False if `worker_id` no longer holds it (it was re-queued)."""
+        try:
+            with self._transaction() as cursor:
+                cursor.execute('''
+                    UPDATE scrape_jobs SET status = 'done', finished_at = ?, error = NULL
+                    WHERE id = ? AND claimed_by = ?
+                ''', (time.time(), job_id, worker_id))
+
+            return cursor.rowcount > 0
+
+        except Exception as e:
+            logger.error(f"Error completing scrape job {job_id}: {e}")
+            return False
+
+    def fail_scrape_job(self, job_id: int, worker_id: str, error: str, retry: bool = False) -> bool:
+        """Mark a job failed, or put it back in the queue when `retry` is set."""
+        try:
+            with self._transaction() as cursor:
+                cursor.execute('''
+                    UPDATE scrape_jobs
+                    SET status = ?, finished_at = ?, error = ?, claimed_by = NULL
+                    WHERE id = ? AND claimed_by = ?
+                ''', ('queued' if retry else 'failed', time.time(), error, job_id, worker_id))
+
+            return cursor.rowcount > 0
+
+        except Exception as e:
+            logger.error(f"Error failing scrape job {job_id}: {e}")
+            return False
+
+    def heartbeat_scrape_jobs(self, worker_id: str) -> bool:
+        """Record that `worker_id` is still alive and working on its running jobs."""
+        try:
+            with self._transaction() as cursor:
+                cursor.execute('''
+                    UPDATE scrape_jobs SET heartbeat_at = ? WHERE status = 'running' AND claimed_by = ?
+                ''', (time.time(), worker_id))
+
+            return True
+
+        except Exception as e:
+            logger.error(f"Error recording heartbeat for {worker_id}: {e}")
+            return False
+
+    def requeue_stale_scrape_jobs(self, timeout: float, max_attempts: int = 3) -> int:
+        """Re-queue running jobs whose worker has not sent a heartbeat for `timeout` seconds."""
+        try:
+            with self._transaction() as cursor:
+                cursor.execute('''
+                    UPDATE scrape_jobs
+                    SET status = CASE WHEN attempts < ? THEN 'queued' ELSE 'failed' END,
+                        claimed_by = NULL, error = 'worker timed out'
+                    WHERE status = 'running' AND COALESCE(heartbeat_at, claimed_at) < ?
+                ''', (max_attempts, time.time() - timeout))
+
+            return cursor.rowcount
+
+        except Exception as e:
+            logger.error(f"Error re-queueing stale scrape jobs: {e}")
+            return 0
+
+    def prune_scrape_jobs(self, older_than: float) -> int:
+        """Delete finished jobs older than `older_than` seconds."""
+        try:
+            with self._transaction() as cursor:
+                cursor.execute('''
+                    DELETE FROM scrape_jobs WHERE status IN ('done', 'failed') AND finished_at < ?
+                ''', (time.time() - older_than,))
+
+            return cursor.rowcount
+
+        except Exception as e:
+            logger.error(f"Error pruning scrape jobs: {e}")
+            return 0
+
+    def get_scrape_job_counts(self) -> Dict[str, int]:
+        """Number of scrape_jobs per status."""
+        try:
+            with self._transaction() as cursor:
+                cursor.execute('SELECT status, COUNT(*) FROM scrape_jobs GROUP BY status')
+                return dict(cursor.fetchall())
+
+        except Exception as e:
+            logger.error(f"Error counting scrape jobs: {e}")
+            return {}
+
+    def save_grade_snapshot(self, telegram_id: int, version: int, content_hash: str, data: bytes,
+                            fetched_at: float, notified: bool = False, keep: int = 30) -> bool:
+        """Store an encoded grade snapshot, keeping the latest `keep` per user.
+
+        A snapshot with the same content as the user's latest one only
+        refreshes that row's fetched_at (and notified flag), so unchanged
+        grades do not grow the history.
+        """
+        try:
+            with self._transaction() as cursor:
+                cursor.execute('''
+                    SELECT id, content_hash FROM grade_snapshots
+                    WHERE telegram_id = ? ORDER BY id DESC LIMIT 1
+                ''', (telegram_id,))
+                latest = cursor.fetchone()
+
+                if latest and latest[1] == content_hash:
+                    cursor.execute('''
+                        UPDATE grade_snapshots SET fetched_at = MAX(fetched_at, ?), notified = MAX(notified, ?)
+                        WHERE id = ?
+                    ''', (fetched_at, int(notified), latest[0]))
+                    return True
+
+                cursor.execute('''
+                    INSERT INTO grade_snapshots (telegram_id, version, content_hash, data, fetched_at, notified)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                ''', (telegram_id, version, content_hash, data, fetched_at, int(notified)))
+                cursor.execute('''
+                    DELETE FROM grade_snapshots
+                    WHERE telegram_id = ? AND id NOT IN (
+                        SELECT id FROM grade_snapshots WHERE telegram_id = ? ORDER BY id DESC LIMIT ?
+                    )
+                ''', (telegram_id, telegram_id, max(1, keep)))
+
+            return True
+
+        except Exception as e:
+            logger.error(f"Error saving grade snapshot for {telegram_id}: {e}")
+            return False
+
+    def delete_grade_snapshots(self, telegram_id: int) -> bool:
+        """Forget a user's grade history (e.g. after switching to another Aspen account)."""
+        try:
+            with self._transaction() as cursor:
+                cursor.execute('DELETE FROM grade_snapshots WHERE telegram_id = ?', (telegram_id,))
+
+            return True
+
+        except Exception as e:
+            logger.error(f"Error deleting grade snapshots for {telegram_id}: {e}")
+            return False
+
+    def get_latest_grade_snapshot(self, telegram_id: int, notified: bool = False) -> Optional[Dict[str, Any]]:
+        """The user's most recent stored snapshot (only ones that were sent if `notified`)."""
+        try:
+            with self._transaction() as cursor:
+                cursor.execute(f'''
+                    SELECT version, content_hash, data, fetched_at, notified FROM grade_snapshots
+                    WHERE telegram_id = ? {'AND notified = 1' if notified else ''}
+                    ORDER BY id DESC LIMIT 1
+                ''', (telegram_id,))
+                row = cursor.fetchone()
+
+            if not row:
+                return None
+            return {
+                'version': row[0],
+                'content_hash': row[1],
+                'data': row[2],
+                'fetched_at': row[3],
+                'notified': bool(row[4]),
+            }
+
+        except Exception as e:
+            logger.error(f"Error getting grade snapshot for {telegram_id}: {e}")
+            return None
+
     def get_user_count(self) -> int:
         """Get total number of active users."""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-
-            cursor.execute('SELECT COUNT(*) FROM users WHERE is_active = 1')
-            count = cursor.fetchone()[0]
-            conn.close()
+            with self._transaction() as cursor:
+                cursor.execute('SELECT COUNT(*) FROM users WHERE is_active = 1')
+                count = cursor.fetchone()[0]
 
             return count
 
@@ -424,12 +1081,18 @@ class Database:
         """Create backup of database."""
         try:
             from datetime import datetime
-            import shutil
 
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
             backup_dir = os.path.dirname(self.db_path)
             backup_path = os.path.join(backup_dir, f"backup_users_{timestamp}.db")
-            shutil.copy2(self.db_path, backup_path)
+
+            # Use the SQLite backup API: a plain file copy would miss pages still in the WAL
+            backup_conn = sqlite3.connect(backup_path)
+            try:
+                with self._lock:
+                    self._conn.backup(backup_conn)
+            finally:
+                backup_conn.close()
 
             logger.info(f"Database backed up to {backup_path}")
             return backup_path
@@ -437,3 +1100,132 @@ class Database:
         except Exception as e:
             logger.error(f"Error creating backup: {e}")
             return None
+
+
+class AsyncDatabase:
+    """Awaitable facade with the same methods as Database.
+
+    Every call runs on one dedicated database thread, so handlers never block
+    the event loop on SQLite. Writes that arrive within `batch_window` seconds
+    of each other are executed together in a single transaction.
+    """
+
+    # Write methods and the value each returns on failure, which callers also
+    # get when the batch they were part of fails to commit
+    WRITE_METHODS = {
+        'add_user': False, 'add_feedback': False, 'update_user_notification_method': False,
+        'update_user_notification_time': False, 'update_user_timezone': False,
+        'deactivate_user': False, 'delete_user': False,
+        'save_aspen_session': False, 'delete_aspen_session': False,
+        'save_notification_schedule': False, 'sync_notification_schedule': False,
+        'record_notification_run': False,
+        'enqueue_scrape_job': None, 'claim_scrape_job': None, 'complete_scrape_job': False,
+        'fail_scrape_job': False, 'heartbeat_scrape_jobs': False, 'requeue_stale_scrape_jobs': 0,
+        'prune_scrape_jobs': 0,
+        'save_grade_snapshot': False, 'delete_grade_snapshots': False,
+    }
+
+    def __init__(self, database: Database, batch_window: float = 0.005):
+        self.database = database
+        self.batch_window = batch_window
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="database")
+        self._pending_writes = []
+        self._flush_handle = None
+
+    def __getattr__(self, name):
+        attr = getattr(self.database, name)
+        if name.startswith('_') or not callable(attr):
+            return attr
+
+        if name in self.WRITE_METHODS:
+            failure_result = self.WRITE_METHODS[name]
+
+            async def method(*args, **kwargs):
+                return await self._submit_write(attr, args, kwargs, failure_result)
+        else:
+            async def method(*args, **kwargs):
+                loop = asyncio.get_running_loop()
+                return await loop.run_in_executor(self._executor, functools.partial(self._call, attr, args, kwargs))
+
+        functools.update_wrapper(method, attr)
+        # Cache the wrapper so __getattr__ only runs once per method name
+        self.__dict__[name] = method
+        return method
+
+    @staticmethod
+    def _call(method, args, kwargs):
+        result = method(*args, **kwargs)
+        # Generators must be consumed on the database thread
+        if inspect.isgenerator(result):
+            return list(result)
+        return result
+
+    async def _submit_write(self, method, args, kwargs, failure_result):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending_writes.append((method, args, kwargs, failure_result, future))
+        if self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.batch_window, self._flush_writes, loop)
+        return await future
+
+    def _flush_writes(self, loop):
+        batch, self._pending_writes = self._pending_writes, []
+        self._flush_handle = None
+        loop.run_in_executor(self._executor, self._run_write_batch, batch, loop)
+
+    def _run_write_batch(self, batch, loop):
+        outcomes = []
+        try:
+            with self.database.batch():
+                for method, args, kwargs, _, _ in batch:
+                    try:
+                        outcomes.append((method(*args, **kwargs), None))
+                    except Exception as e:
+                        outcomes.append((None, e))
+        except Exception as e:
+            # Nothing was written: report the same failure value each method returns on its own errors
+            logger.error(f"Error committing batch of {len(batch)} database writes: {e}")
+            outcomes = [(failure_result, None) for _, _, _, failure_result, _ in batch]
+
+        for (_, _, _, _, future), (result, error) in zip(batch, outcomes):
+            loop.call_soon_threadsafe(self._resolve, future, result, error)
+
+    @staticmethod
+    def _resolve(future, result, error):
+        if future.cancelled():
+            return
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        self.database.close()
+
+
+# Process-wide instances, see get_database() / get_async_database()
+_database = None
+_async_database = None
+_instance_lock = threading.Lock()
+
+
+def get_database() -> Database:
+    """Return the shared Database, creating it on first call (without touching disk)."""
+    global _database
+    if _database is None:
+        with _instance_lock:
+            if _database is None:
+                _database = Database()
+    return _database
+
+
+def get_async_database() -> AsyncDatabase:
+    """Return the shared AsyncDatabase wrapping get_database()."""
+    global _async_database
+    if _async_database is None:
+        database = get_database()
+        with _instance_lock:
+            if _async_database is None:
+                _async_database = AsyncDatabase(database)
+    return _async_database
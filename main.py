@@ -1,78 +1,107 @@
+from contextlib import asynccontextmanager
 from http import HTTPStatus
 from fastapi import FastAPI, Request, Response
 from fastapi.staticfiles import StaticFiles
 from telegram import Update
-from telegram.ext import CommandHandler, CallbackQueryHandler, MessageHandler, filters, ContextTypes
+from telegram.ext import CommandHandler, CallbackQueryHandler, MessageHandler, filters
 import uvicorn
-from bot.ptb import ptb, lifespan
-from bot.handlers import (start, fetch_grades, status, donate, help_command,
-                         admin_stats, feedback, handle_feedback_message,
-                         registration_handler, settings_handler, setup_handler)
-from bot.scheduler import setup_scheduler
+from bot.ptb import ptb, lifespan, get_serverless_app
+from bot.webhook import webhook_intake, webhook_log
+from bot.log import configure_logging
 import config
 import logging
+import time
 
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO
-)
+configure_logging()
 logger = logging.getLogger(__name__)
 
-# Initialize FastAPI with lifespan from ptb
-app = FastAPI(lifespan=lifespan) if config.ENV else FastAPI()
+def register_handlers(application):
+    """Add all handlers; imported here so serverless cold starts only pay for it on the first update"""
+    from bot.handlers import (start, fetch_grades, refresh_grades, status, donate, help_command,
+                              admin_stats, feedback, handle_feedback_message,
+                              registration_handler, settings_handler, setup_handler)
+
+    # Scrapes run as background tasks so they do not hold up other users' updates.
+    # A serverless invocation must finish its work before returning, so it stays blocking.
+    background = not config.SERVERLESS
+
+    # Add handlers
+    application.add_handler(CommandHandler("start", start))
+    application.add_handler(CommandHandler("grades", fetch_grades, block=not background))
+    # Must be registered before setup_handler, whose entry point matches every callback
+    application.add_handler(CallbackQueryHandler(refresh_grades, pattern=r"^grades_refresh$", block=not background))
+    application.add_handler(CommandHandler("status", status))
+    application.add_handler(CommandHandler("donate", donate))
+    application.add_handler(CommandHandler("help", help_command))
+    application.add_handler(CommandHandler("feedback", feedback))
+
+    # Admin handlers
+    application.add_handler(CommandHandler("admin", admin_stats))
 
-# Add handlers
-ptb.add_handler(CommandHandler("start", start))
-ptb.add_handler(CommandHandler("grades", fetch_grades))
-ptb.add_handler(CommandHandler("status", status))
-ptb.add_handler(CommandHandler("donate", donate))
-ptb.add_handler(CommandHandler("help", help_command))
-ptb.add_handler(CommandHandler("feedback", feedback))
+    # Add conversation handlers
+    application.add_handler(registration_handler)
+    application.add_handler(settings_handler)
+    application.add_handler(setup_handler)
 
-# Admin handlers
-ptb.add_handler(CommandHandler("admin", admin_stats))
+    # Add feedback message handler
+    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_feedback_message))
 
-# Add conversation handlers
-ptb.add_handler(registration_handler)
-ptb.add_handler(settings_handler)
-ptb.add_handler(setup_handler)
+    # Note: Conversation handlers manage their own callbacks
+    # Global callback handler removed to prevent conflicts
 
-# Add feedback message handler
-ptb.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_feedback_message))
+def setup_bot():
+    """Register handlers and schedule the daily jobs in the bot process.
 
-# Note: Conversation handlers manage their own callbacks
-# Global callback handler removed to prevent conflicts
+    Not run at import: spawned scrape workers re-import this module (as
+    __mp_main__) and must not re-plan the schedule. Serverless instances
+    register handlers lazily and never run the scheduler.
+    """
+    if config.SERVERLESS:
+        return
 
-# Add debug message handler to catch all messages
-async def debug_message_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Debug handler to catch all messages."""
-    if update.message and update.message.text:
-        logger.info(f"Debug: Received message: '{update.message.text}' from user {update.effective_user.id}")
-        logger.info(f"Debug: Current conversation state: {context.user_data}")
+    from bot.scheduler import setup_scheduler
 
-ptb.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, debug_message_handler))
+    register_handlers(ptb)
 
-# Initialize scheduler
-setup_scheduler(ptb)
+    # Initialize scheduler
+    setup_scheduler(ptb)
+
+@asynccontextmanager
+async def app_lifespan(fastapi_app: FastAPI):
+    setup_bot()
+    async with lifespan(fastapi_app):
+        yield
+
+# Initialize FastAPI with lifespan from ptb
+app = FastAPI(lifespan=app_lifespan) if config.ENV else FastAPI()
 
 # Use webhook when running in prod (via gunicorn)
 if config.ENV:
 
     @app.post("/api/webhook")
     async def process_update(request: Request):
+        started = time.perf_counter()
         try:
             req = await request.json()
-            logger.info(f"Received update: {req}")
             update = Update.de_json(req, ptb.bot)
 
-            # In serverless environment like Vercel, we need to initialize PTB for each request
+            # In serverless environment like Vercel, PTB is initialized once per warm instance
             if config.SERVERLESS:
-                async with ptb:
-                    await ptb.process_update(update)
+                application = await get_serverless_app(register_handlers)
+                await application.process_update(update)
+                status_code = HTTPStatus.OK
             else:
-                await ptb.process_update(update)
+                # Acknowledge right away; the running Application handles the update from its queue
+                status_code = await webhook_intake.submit(update, ptb.update_queue)
 
-            return Response(status_code=HTTPStatus.OK)
+            # Counts and timings only; update contents are never logged
+            webhook_log.record(
+                next((key for key in req if key != 'update_id'), 'unknown'),
+                (time.perf_counter() - started) * 1000,
+                update_id=update.update_id,
+                status=int(status_code)
+            )
+            return Response(status_code=status_code)
         except Exception as e:
             logger.error(f"Error processing update: {str(e)}", exc_info=True)
             return Response(status_code=HTTPStatus.INTERNAL_SERVER_ERROR, content=str(e))
@@ -81,7 +110,13 @@ if config.ENV:
 if __name__ == "__main__":
     if not config.ENV:
         logger.info("Running in local mode")
-        ptb.run_polling()
+        setup_bot()
+        from bot.worker import start_workers, stop_workers
+        workers = start_workers(config.SCRAPE_WORKERS) if config.SCRAPE_WORKERS > 0 else []
+        try:
+            ptb.run_polling()
+        finally:
+            stop_workers(workers)
     else:
         # Used for testing webhook locally, instructions for how to set up local webhook at https://dev.to/ibrarturi/how-to-test-webhooks-on-your-localhost-3b4f
         logger.info("Running in prod mode")